@@ -2,20 +2,22 @@ import sys
 import time
 import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QPushButton, QSlider, QLabel, QGroupBox, QGridLayout)
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPainter, QColor, QPen, QBrush
+                            QPushButton, QSlider, QLabel, QGroupBox, QGridLayout, QSpinBox, QComboBox)
+from PyQt5.QtCore import Qt, QTimer, QRectF
+from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QImage
 
 import matplotlib
 matplotlib.use('Qt5Agg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
-from environment import Environment
+from environment import Environment, prefer_full_map
 from ant import RedAnt, BlackAnt
 from colony import Colony
 from creatures import CreatureManager
+from density import POINTS, VIEW_MODES, DensityOverlay
 from simulation import Simulation
+from spatial import GridIndex
 
 class PopulationGraph(FigureCanvas):
     """Виджет для отображения графика численности популяций"""
@@ -54,18 +56,13 @@ class PopulationGraph(FigureCanvas):
         """Обновление данных графика"""
         max_points = 100  # Ограничим количество точек для производительности
         
-        # Добавляем новые данные
-        self.red_pop_data.append(len(sim.red_colony.ants))
-        self.black_pop_data.append(len(sim.black_colony.ants))
+        # Добавляем новые данные из общего снимка статистики дня
+        snapshot = sim.stats()
+        self.red_pop_data.append(snapshot.red_ants)
+        self.black_pop_data.append(snapshot.black_ants)
         self.time_data.append(sim.day)
-        
-        if sim.creature_manager:
-            creatures_count = sim.creature_manager.count()
-            self.peaceful_pop_data.append(creatures_count['peaceful'])
-            self.predator_pop_data.append(creatures_count['predators'])
-        else:
-            self.peaceful_pop_data.append(0)
-            self.predator_pop_data.append(0)
+        self.peaceful_pop_data.append(snapshot.peaceful_creatures)
+        self.predator_pop_data.append(snapshot.predators)
         
         # Ограничиваем количество точек для лучшей производительности
         if len(self.time_data) > max_points:
@@ -96,17 +93,85 @@ class PopulationGraph(FigureCanvas):
 
 
 class SimulationCanvas(QWidget):
-    """Виджет для рисования симуляции"""
+    """Виджет для рисования симуляции
+
+    Колесо мыши меняет масштаб вокруг курсора, перетаскивание левой
+    кнопкой сдвигает вид, двойной щелчок возвращает исходный вид. Рисуются
+    только видимая часть карты еды и сущности, найденные в области
+    просмотра через GridIndex, поэтому стоимость кадра зависит от видимой
+    части мира, а не от его размера.
+    """
+    
+    MIN_SCALE = 0.25
+    MAX_SCALE = 80.0
+    ZOOM_STEP = 1.25
     
     def __init__(self, parent=None):
         super(SimulationCanvas, self).__init__(parent)
         self.simulation = None
-        self.scale_factor = 5  # Масштаб отображения
+        self.scale_factor = 5  # Масштаб отображения: пикселей на единицу мира
+        self.offset = np.zeros(2)  # Точка мира в левом верхнем углу виджета
+        self._drag_start = None
+        self.overlay = None  # Плотность и территории для большого числа сущностей
+        self.view_mode = VIEW_MODES[0]
+        # Индексы позиций групп для выборки видимых сущностей
+        self.indexes = {group: GridIndex() for group in ('red', 'black', 'peaceful', 'predators')}
+        # Изображение всей карты еды; между кадрами перерисовываются только измененные фрагменты
+        self._food_image = None
+        self._food_source = None  # Среда и версия еды, по которым построено изображение
         
     def set_simulation(self, simulation):
         """Установка симуляции для отображения"""
         self.simulation = simulation
+        self.overlay = DensityOverlay(simulation, mode=self.view_mode)
+        self.update()
+    
+    def set_view_mode(self, mode):
+        """Режим отображения сущностей: точки, плотность, территории или авто"""
+        self.view_mode = mode
+        if self.overlay:
+            self.overlay.mode = mode
+        self.update()
+    
+    def reset_view(self):
+        """Исходный масштаб и положение вида"""
+        self.scale_factor = 5
+        self.offset = np.zeros(2)
         self.update()
+    
+    def viewport(self):
+        """Видимый прямоугольник мира (x0, y0, x1, y1)"""
+        x0, y0 = self.offset
+        return x0, y0, x0 + self.width() / self.scale_factor, y0 + self.height() / self.scale_factor
+    
+    def wheelEvent(self, event):
+        """Масштабирование вокруг точки под курсором"""
+        steps = event.angleDelta().y() / 120
+        scale = min(max(self.scale_factor * self.ZOOM_STEP ** steps, self.MIN_SCALE), self.MAX_SCALE)
+        cursor = np.array([event.pos().x(), event.pos().y()], dtype=float)
+        # Точка мира под курсором остается на месте
+        self.offset = self.offset + cursor / self.scale_factor - cursor / scale
+        self.scale_factor = scale
+        self.update()
+    
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_start = (event.pos(), self.offset.copy())
+    
+    def mouseMoveEvent(self, event):
+        if self._drag_start is None:
+            return
+        start, offset = self._drag_start
+        moved = np.array([event.pos().x() - start.x(), event.pos().y() - start.y()], dtype=float)
+        self.offset = offset - moved / self.scale_factor
+        self.update()
+    
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_start = None
+    
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
         
     def paintEvent(self, event):
         if not self.simulation:
@@ -114,56 +179,115 @@ class SimulationCanvas(QWidget):
             
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        viewport = self.viewport()
         
-        # Отрисовка еды
-        for x in range(self.simulation.environment.width):
-            for y in range(self.simulation.environment.height):
-                food_amount = self.simulation.environment.food_map[x, y]
-                if food_amount > 0:
-                    # Интенсивность цвета зависит от количества еды
-                    color_intensity = min(255, int(food_amount * 10))
-                    painter.setBrush(QBrush(QColor(0, color_intensity, 0)))
-                    painter.setPen(Qt.NoPen)
-                    painter.drawRect(x * self.scale_factor, y * self.scale_factor, 
-                                    self.scale_factor, self.scale_factor)
+        # Отрисовка видимой части карты еды одним изображением
+        self._draw_food(painter, viewport)
+        
+        # При большом числе сущностей вместо точек рисуется одно изображение плотности
+        mode = self.overlay.active_mode()
+        if mode != POINTS:
+            self._draw_overlay(painter, mode, viewport)
+            return
         
         # Отрисовка мирных существ (синий цвет)
         if self.simulation.creature_manager:
+            creature_manager = self.simulation.creature_manager
             painter.setBrush(QBrush(QColor(0, 0, 255)))
-            for creature in self.simulation.creature_manager.peaceful_creatures:
-                if creature.alive:
-                    painter.drawEllipse(int(creature.position[0] * self.scale_factor),
-                                      int(creature.position[1] * self.scale_factor),
-                                      int(creature.size * self.scale_factor * 0.8),
-                                      int(creature.size * self.scale_factor * 0.8))
+            self._draw_creatures(painter, 'peaceful', creature_manager.peaceful_creatures, 0.8, viewport)
             
             # Отрисовка хищников (фиолетовый цвет)
             painter.setBrush(QBrush(QColor(150, 0, 150)))
-            for predator in self.simulation.creature_manager.predators:
-                if predator.alive:
-                    painter.drawEllipse(int(predator.position[0] * self.scale_factor),
-                                      int(predator.position[1] * self.scale_factor),
-                                      int(predator.size * self.scale_factor),
-                                      int(predator.size * self.scale_factor))
+            self._draw_creatures(painter, 'predators', creature_manager.predators, 1.0, viewport)
         
         # Отрисовка муравьев
         # Красные муравьи
         painter.setBrush(QBrush(QColor(255, 0, 0)))
-        for ant in self.simulation.red_colony.ants:
-            if ant.alive:
-                size = self.scale_factor * 0.8
-                painter.drawEllipse(int(ant.position[0] * self.scale_factor),
-                                  int(ant.position[1] * self.scale_factor),
-                                  int(size), int(size))
+        self._draw_ants(painter, 'red', self.simulation.red_colony.ants, viewport)
         
         # Черные муравьи
         painter.setBrush(QBrush(QColor(0, 0, 0)))
-        for ant in self.simulation.black_colony.ants:
-            if ant.alive:
-                size = self.scale_factor * 0.8
-                painter.drawEllipse(int(ant.position[0] * self.scale_factor),
-                                  int(ant.position[1] * self.scale_factor),
-                                  int(size), int(size))
+        self._draw_ants(painter, 'black', self.simulation.black_colony.ants, viewport)
+    
+    def _visible(self, group, entities, viewport, margin=0.0):
+        """Индексы сущностей группы внутри области просмотра (с запасом margin)"""
+        x0, y0, x1, y1 = viewport
+        return self.indexes[group].update(entities).query(x0 - margin, y0 - margin, x1, y1)
+    
+    def _draw_image(self, painter, buffer, x, y, cell):
+        """Отрисовка RGBA-буфера (строки по y) с углом в точке мира (x, y)"""
+        # Буфер хранится в self, пока QImage ссылается на его память
+        self._image_buffer = np.ascontiguousarray(buffer)
+        rows, columns = self._image_buffer.shape[:2]
+        image = QImage(self._image_buffer.data, columns, rows, 4 * columns, QImage.Format_RGBA8888)
+        size = cell * self.scale_factor
+        painter.drawImage(QRectF((x - self.offset[0]) * self.scale_factor, (y - self.offset[1]) * self.scale_factor,
+                                 columns * size, rows * size), image)
+    
+    @staticmethod
+    def _paint_food(rgba, food):
+        """Цвета клеток еды (строки по y); интенсивность зеленого зависит от количества, пустые клетки прозрачны"""
+        rgba[..., 1] = np.minimum(food * 10, 255)
+        rgba[..., 3] = np.where(food > 0, 255, 0)
+    
+    def _food_rgba(self):
+        """RGBA-изображение карты еды, обновленное по измененным фрагментам среды"""
+        environment = self.simulation.environment
+        source = self._food_source
+        if source is None or source[0] is not environment:
+            # Новая симуляция или перемотка: изображение строится заново
+            self._food_image = np.zeros((environment.height, environment.width, 4), dtype=np.uint8)
+            self._paint_food(self._food_image, environment.food_map.T)
+        elif environment.food_version != source[1]:
+            dirty = environment.dirty_tiles(source[1])
+            if prefer_full_map(dirty, environment.width, environment.height):
+                self._paint_food(self._food_image, environment.food_map.T)
+            else:
+                for tx, ty in np.argwhere(dirty):
+                    x0, x1, y0, y1 = environment.tile_bounds(tx, ty)
+                    self._paint_food(self._food_image[y0:y1, x0:x1], environment.food_map[x0:x1, y0:y1].T)
+        self._food_source = (environment, environment.food_version)
+        return self._food_image
+    
+    def _draw_food(self, painter, viewport):
+        """Отрисовка клеток еды, попавших в область просмотра"""
+        environment = self.simulation.environment
+        x0, y0, x1, y1 = viewport
+        left, top = max(int(x0), 0), max(int(y0), 0)
+        right, bottom = min(int(np.ceil(x1)), environment.width), min(int(np.ceil(y1)), environment.height)
+        if left >= right or top >= bottom:
+            return
+        self._draw_image(painter, self._food_rgba()[top:bottom, left:right], left, top, 1)
+    
+    def _draw_overlay(self, painter, mode, viewport):
+        """Отрисовка видимой части плотности или территорий одним изображением"""
+        cell = self.overlay.cell
+        x0, y0, x1, y1 = viewport
+        left, top = max(int(x0 // cell), 0), max(int(y0 // cell), 0)
+        right = min(int(np.ceil(x1 / cell)), self.overlay.columns)
+        bottom = min(int(np.ceil(y1 / cell)), self.overlay.rows)
+        if left >= right or top >= bottom:
+            return
+        self._draw_image(painter, self.overlay.image(mode)[top:bottom, left:right], left * cell, top * cell, cell)
+    
+    def _draw_ants(self, painter, group, ants, viewport):
+        """Отрисовка живых муравьев колонии в области просмотра"""
+        size = int(self.scale_factor * 0.8)
+        visible = self._visible(group, ants, viewport, margin=0.8)
+        positions = ((ants.positions()[visible] - self.offset) * self.scale_factor).astype(int)
+        for index, (x, y) in zip(visible.tolist(), positions.tolist()):
+            if ants[index].alive:
+                painter.drawEllipse(x, y, size, size)
+    
+    def _draw_creatures(self, painter, group, store, size_factor, viewport):
+        """Отрисовка живых существ из массивного хранилища в области просмотра"""
+        visible = self._visible(group, store, viewport, margin=float(store.size[:store.count].max(initial=0)))
+        visible = visible[store.alive[visible]]
+        positions = ((store.position[visible] - self.offset) * self.scale_factor).astype(int)
+        sizes = (store.size[visible] * self.scale_factor * size_factor).astype(int)
+        for (x, y), size in zip(positions.tolist(), sizes.tolist()):
+            painter.drawEllipse(x, y, size, size)
 
 
 class StatsPanel(QWidget):
@@ -214,6 +338,7 @@ class StatsPanel(QWidget):
         red_stats_text += f"Скорость: {red_stats['speed']:.1f}, "
         red_stats_text += f"Плодовитость: {red_stats['fertility']:.3f}, "
         red_stats_text += f"Внимательность: {red_stats['awareness']:.1f}"
+        red_stats_text += self._format_quantiles(stats['red_quantiles'])
         self.red_stats_label.setText(red_stats_text)
         
         # Форматирование статистики черных муравьев
@@ -224,7 +349,19 @@ class StatsPanel(QWidget):
         black_stats_text += f"Скорость: {black_stats['speed']:.1f}, "
         black_stats_text += f"Плодовитость: {black_stats['fertility']:.3f}, "
         black_stats_text += f"Внимательность: {black_stats['awareness']:.1f}"
+        black_stats_text += self._format_quantiles(stats['black_quantiles'])
         self.black_stats_label.setText(black_stats_text)
+    
+    @staticmethod
+    def _format_quantiles(quantiles):
+        """Строки вида 'Скорость: медиана [p10 - p90]' для распределений признаков"""
+        names = {'damage': 'Урон', 'speed': 'Скорость', 'fertility': 'Плодовитость',
+                 'awareness': 'Внимательность'}
+        text = ""
+        for trait, values in quantiles.items():
+            text += (f"\n{names.get(trait, trait)}: {values['median']:.2f} "
+                     f"[{values['p10']:.2f} - {values['p90']:.2f}]")
+        return text
 
 
 class SimulationApp(QMainWindow):
@@ -276,6 +413,27 @@ class SimulationApp(QMainWindow):
 
         # Добавляем ползунок скорости
         control_panel.addLayout(speed_layout)
+        
+        # Перемотка к дню по журналу событий
+        seek_layout = QHBoxLayout()
+        seek_layout.addWidget(QLabel("День:"))
+        self.seek_spin = QSpinBox()
+        self.seek_spin.setMaximum(10 ** 6)
+        self.seek_button = QPushButton("Перейти")
+        self.seek_button.clicked.connect(self.seek_day)
+        seek_layout.addWidget(self.seek_spin)
+        seek_layout.addWidget(self.seek_button)
+        control_panel.addLayout(seek_layout)
+        self._enable_seek(False)
+        
+        # Режим отображения сущностей
+        view_layout = QHBoxLayout()
+        view_layout.addWidget(QLabel("Вид:"))
+        self.view_combo = QComboBox()
+        self.view_combo.addItems(VIEW_MODES)
+        self.view_combo.currentTextChanged.connect(self.set_view_mode)
+        view_layout.addWidget(self.view_combo)
+        control_panel.addLayout(view_layout)
         control_panel.addWidget(QLabel(""))  # Разделитель
 
         # Статистика
@@ -328,3 +486,28 @@ class SimulationApp(QMainWindow):
         self.speed_label.setText(f"{speed:.1f}x")
         self.simulation_canvas.set_speed(speed)
         self.stats_graph.set_speed(speed)
+
+    def set_view_mode(self, mode):
+        """Переключение между точками, плотностью и территориями"""
+        self.simulation_canvas.set_view_mode(mode)
+
+    def set_simulation(self, simulation):
+        """Отображение симуляции; перемотка доступна, только если у нее есть журнал событий"""
+        self.simulation_canvas.set_simulation(simulation)
+        self._enable_seek(simulation.recorder is not None)
+    
+    def _enable_seek(self, enabled):
+        """Включение элементов перемотки с пояснением, почему они недоступны"""
+        tooltip = "" if enabled else "Перемотка требует симуляции с журналом событий (recorder)"
+        for widget in (self.seek_spin, self.seek_button):
+            widget.setEnabled(enabled)
+            widget.setToolTip(tooltip)
+    
+    def seek_day(self):
+        """Перемотка симуляции к выбранному дню (нужен журнал событий)"""
+        simulation = self.simulation_canvas.simulation
+        if not simulation or not simulation.recorder:
+            return
+        simulation.seek(self.seek_spin.value())
+        self.simulation_canvas.update()
+        self.stats_panel.update_stats(simulation)
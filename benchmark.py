@@ -0,0 +1,318 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ant import RedAnt, BlackAnt
+from creatures import CreatureManager, PeacefulCreature, Predator
+from entity_list import EntityList
+from environment import Environment
+from lineage import LineageStore
+
+
+class _DictEntity:
+    """Объект со словарем атрибутов - прежнее представление сущностей"""
+
+
+def _legacy_copy(entity):
+    """Копия сущности в прежнем виде: __dict__, кортеж позиции, цвет в экземпляре"""
+    legacy = _DictEntity()
+    for cls in type(entity).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            legacy.__dict__[name] = getattr(entity, name)
+    legacy.position = tuple(entity.position)
+    # Строки пола и цвета раньше создавались заново для каждого экземпляра
+    legacy.color = ''.join(entity.color)
+    if hasattr(entity, 'gender'):
+        legacy.gender = ''.join(entity.gender)
+    for name in ('reproduction_rate', 'awareness'):
+        if name in type(entity).__dict__:
+            legacy.__dict__[name] = getattr(entity, name)
+    return legacy
+
+
+def _measure(factory, count):
+    """Количество байт, занятых count объектами, созданными factory"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return after - before
+
+
+def memory_per_100k(count=100_000):
+    """Память на count сущностей каждого типа до и после перехода на __slots__"""
+    factories = {
+        'RedAnt': lambda i: RedAnt(i, (random.uniform(0, 100), random.uniform(0, 100))),
+        'BlackAnt': lambda i: BlackAnt(i, (random.uniform(0, 100), random.uniform(0, 100))),
+        'PeacefulCreature': lambda i: PeacefulCreature(i, (random.uniform(0, 100), random.uniform(0, 100))),
+        'Predator': lambda i: Predator(i, (random.uniform(0, 100), random.uniform(0, 100))),
+    }
+
+    report = {}
+    for name, factory in factories.items():
+        before = _measure(lambda i: _legacy_copy(factory(i)), count)
+        after = _measure(factory, count)
+        report[name] = (before, after)
+    return report
+
+
+def print_memory_report(count=100_000):
+    """Вывод отчета о памяти в мегабайтах"""
+    print(f"Память на {count} сущностей (МБ):")
+    print(f"{'Тип':<18}{'до':>10}{'после':>10}{'экономия':>10}")
+    for name, (before, after) in memory_per_100k(count).items():
+        saving = 1 - after / before if before else 0
+        print(f"{name:<18}{before / 2**20:>10.1f}{after / 2**20:>10.1f}{saving:>10.0%}")
+
+
+def creature_tick_time(peaceful=100_000, predators=10, ticks=50):
+    """Среднее время обновления CreatureManager без муравьев"""
+    environment = Environment(1000, 1000, initial_food=0)
+    creature_manager = CreatureManager(environment)
+    creature_manager.add_peaceful_creatures(peaceful)
+    creature_manager.add_predators(predators)
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        creature_manager.update()
+    elapsed = (time.perf_counter() - start) / ticks
+    print(f"{peaceful} мирных существ, {predators} хищников: {elapsed * 1000:.1f} мс на тик")
+    print(f"Итоговая численность: {creature_manager.count()}")
+
+
+def pursuit_tradeoff(ants=5000, predators=200, ticks=60, intervals=(1, 2, 5, 10, 25), seed=0):
+    """Время охоты хищников и ее успешность при разных интервалах перепоиска цели"""
+    print(f"{ants} муравьев, {predators} хищников, {ticks} тиков")
+    print(f"{'Интервал':>9}{'мс/тик':>10}{'атак':>8}{'убито':>8}")
+    for interval in intervals:
+        random.seed(seed)
+        np.random.seed(seed)
+        environment = Environment(300, 300, initial_food=0)
+        creature_manager = CreatureManager(environment, retarget_interval=interval)
+        creature_manager.add_predators(predators)
+        red = EntityList(RedAnt(i, (random.uniform(0, 300), random.uniform(0, 300))) for i in range(ants // 2))
+        black = EntityList(BlackAnt(i, (random.uniform(0, 300), random.uniform(0, 300))) for i in range(ants // 2))
+
+        elapsed = 0.0
+        for _ in range(ticks):
+            for group in (red, black):
+                for ant in group:
+                    ant.move(environment)
+                group.touch()
+            start = time.perf_counter()
+            creature_manager.update(red, black)
+            elapsed += time.perf_counter() - start
+            creature_manager.apply_strikes()
+        print(f"{interval:>9}{elapsed / ticks * 1000:>10.2f}"
+              f"{creature_manager.hunt_strikes:>8}{creature_manager.hunt_kills:>8}")
+
+
+# Модули интерфейса, которые не должны загружаться в безголовом режиме
+GUI_MODULES = ('matplotlib', 'PyQt5', 'visualization', 'app')
+
+
+def startup_time(runs=5, days=1):
+    """Время запуска безголового main.py и проверка отсутствия импорта GUI"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, 'main.py', '--days', str(days), '--seed', '0']
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=directory, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    print(f"Запуск main.py на {days} дн.: лучший {min(timings) * 1000:.0f} мс из {runs}")
+
+    probe = (f"import sys, main; main.main(['--days', '{days}', '--seed', '0']); "
+             f"print('GUI:', *(m for m in {GUI_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', probe], cwd=directory, check=True,
+                            capture_output=True, text=True)
+    loaded = result.stdout.splitlines()[-1][len('GUI:'):].strip()
+    if loaded:
+        print(f"Безголовый режим загрузил модули интерфейса: {loaded}")
+        raise SystemExit(1)
+    print("Модули интерфейса не загружались")
+
+
+def lineage_scale(births=10_000_000, population=100_000, batch=100_000, seed=0):
+    """Память и время запросов родословной на синтетической популяции"""
+    rng = np.random.default_rng(seed)
+    lineage = LineageStore()
+    lineage.record(0, np.arange(population))
+    living = np.arange(population)
+    next_id = population
+
+    start = time.perf_counter()
+    while next_id < population + births:
+        # Пары родителей из живых, потомки вытесняют случайных живых
+        parents = rng.choice(living, size=(batch, 2))
+        children = np.arange(next_id, next_id + batch)
+        lineage.day += 1
+        lineage.record(0, children, parents[:, 0], parents[:, 1])
+        living[rng.choice(population, batch, replace=False)] = children
+        next_id += batch
+    print(f"{births} рождений: {time.perf_counter() - start:.1f} с, "
+          f"{lineage.nbytes() / 2**20:.0f} МБ ({lineage.count} записей)")
+
+    row = int(lineage.rows(0, [next_id - 1])[0])
+    for name, query in (('предки', lambda: lineage.ancestors(row, generations=10)),
+                        ('потомки основателя', lambda: lineage.descendants(0, generations=3)),
+                        ('общий предок', lambda: lineage.common_ancestor(row, row - 1)),
+                        ('выживание линий', lambda: lineage.survival(0, living))):
+        start = time.perf_counter()
+        result = query()
+        size = np.size(result[0]) if isinstance(result, tuple) else np.size(result)
+        print(f"{name:<20}{(time.perf_counter() - start) * 1000:>10.1f} мс  (результат: {size})")
+
+
+def render_throughput(days=1000, workers=None, seed=0):
+    """Скорость отрисовки снимков прогона: последовательно и в пуле процессов"""
+    from render import SnapshotRecorder, rasterize, render_frames
+    from scenario import build_simulation
+    from service import decode_frame
+
+    simulation = build_simulation(seed=seed)
+    snapshots = SnapshotRecorder(simulation)
+    simulation.run(days)
+    width, height, frames = snapshots.width, snapshots.height, snapshots.frames
+    print(f"{len(frames)} снимков, {sum(map(len, frames)) / 2**20:.1f} МБ")
+
+    start = time.perf_counter()
+    food = np.zeros(width * height, dtype=np.float32)
+    for frame in frames:
+        decoded = decode_frame(frame)
+        food[decoded['food_index']] = decoded['food_value']
+        rasterize(food.reshape(width, height), decoded)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in render_frames(width, height, frames, workers=workers):
+        pass
+    pooled = time.perf_counter() - start
+    print(f"Последовательно: {len(frames) / serial:.0f} кадров/с, "
+          f"пул ({workers or os.cpu_count()} проц.): {len(frames) / pooled:.0f} кадров/с")
+
+
+def spawn_time(count=1_000_000):
+    """Создание колонии из count муравьев: по одному, как раньше, и пакетно Colony.spawn"""
+    from colony import Colony
+
+    environment = Environment(1000, 1000, initial_food=0)
+    start = time.perf_counter()
+    colony = Colony(RedAnt, 0, environment)
+    for _ in range(count):
+        position = (random.randint(0, environment.width - 1), random.randint(0, environment.height - 1))
+        ant = RedAnt(colony.next_ant_id(), position)
+        colony.ants.append(ant)
+        colony._register_all([ant])
+    colony.trait_distribution.add(colony.ants)
+    single = time.perf_counter() - start
+    del colony, ant
+    start = time.perf_counter()
+    Colony(RedAnt, count, environment)
+    bulk = time.perf_counter() - start
+    print(f"Колония из {count} муравьев: по одному {single:.2f} с, Colony.spawn {bulk:.2f} с")
+
+
+def lattice_comparison(days=100, seed=0):
+    """Непрерывный и решеточный режимы на одних сценариях: время расчета и поиска соседей"""
+    from scenario import build_simulation
+
+    scenarios = {
+        'по умолчанию': {},
+        'с существами': {'peaceful': 100, 'predators': 10},
+        'плотный 5000+5000': {'width': 200, 'height': 200, 'food': 20000, 'red_ants': 5000, 'black_ants': 5000,
+                               'peaceful': 500, 'predators': 20},
+    }
+    print(f"{'Сценарий':<20}{'режим':<14}{'всего, с':>10}{'соседи, с':>11}{'муравьев':>10}")
+    for name, config in scenarios.items():
+        for lattice in (False, True):
+            simulation = build_simulation(seed=seed, lattice=lattice, **config)
+            cache = simulation.neighbors
+            compute = cache._compute
+            spent = [0.0]
+
+            def timed_compute(*args):
+                start = time.perf_counter()
+                try:
+                    return compute(*args)
+                finally:
+                    spent[0] += time.perf_counter() - start
+
+            cache._compute = timed_compute
+            start = time.perf_counter()
+            stats = simulation.run(days)
+            total = time.perf_counter() - start
+            mode = 'решетка' if lattice else 'непрерывный'
+            print(f"{name:<20}{mode:<14}{total:>10.2f}{spent[0]:>11.2f}{stats['red_ants'] + stats['black_ants']:>10}")
+
+
+def food_delta(size=1000, days=50, seed=0):
+    """Кадр и копия еды в большой среде: вся карта против только измененных фрагментов"""
+    from scenario import build_simulation
+    from service import _view, encode_frame
+
+    simulation = build_simulation(seed=seed, width=size, height=size, food=size * size // 20,
+                                  red_ants=2000, black_ants=2000)
+    timings = {'кадр, вся карта': 0.0, 'кадр, фрагменты': 0.0, 'копия, вся карта': 0.0, 'копия, фрагменты': 0.0}
+    dirty = 0
+    copy = simulation.environment.food_map.copy()
+    previous = _view(simulation)
+    for _ in range(days):
+        simulation.update()
+        view = _view(simulation)
+        start = time.perf_counter()
+        full = encode_frame(0, view, previous['food'])
+        timings['кадр, вся карта'] += time.perf_counter() - start
+        start = time.perf_counter()
+        delta = encode_frame(0, view, previous['food'], previous['food_version'])
+        timings['кадр, фрагменты'] += time.perf_counter() - start
+        assert full == delta
+        # Копия карты, как в SharedStateExporter
+        environment = simulation.environment
+        start = time.perf_counter()
+        np.copyto(copy, environment.food_map)
+        timings['копия, вся карта'] += time.perf_counter() - start
+        start = time.perf_counter()
+        cells = environment.dirty_cells(previous['food_version'])
+        if cells is None:
+            np.copyto(copy, environment.food_map)
+        else:
+            copy.ravel()[cells] = environment.food_map.ravel()[cells]
+        timings['копия, фрагменты'] += time.perf_counter() - start
+        dirty += int(environment.dirty_tiles(previous['food_version']).sum())
+        previous = view
+    tiles = simulation.environment.tile_versions.size
+    print(f"Среда {size}x{size}, в среднем изменено фрагментов за день: {dirty / days:.0f} из {tiles}")
+    for name, total in timings.items():
+        print(f"{name:<20}{total / days * 1000:>8.2f} мс")
+
+
+BENCHMARKS = {
+    'memory': print_memory_report,
+    'creatures': creature_tick_time,
+    'pursuit': pursuit_tradeoff,
+    'startup': startup_time,
+    'lineage': lineage_scale,
+    'render': render_throughput,
+    'spawn': spawn_time,
+    'lattice': lattice_comparison,
+    'food_delta': food_delta,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки симуляции муравьев")
+    parser.add_argument('name', choices=sorted(BENCHMARKS), help="Название бенчмарка")
+    args = parser.parse_args()
+    BENCHMARKS[args.name]()
+
+
+if __name__ == "__main__":
+    main()
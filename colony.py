@@ -1,18 +1,81 @@
-import random
+import gc
+
+import numpy as np
+
+from ant import GENDERS, MALE, TRAITS
+from entity_list import EntityList
+from lattice import snap
+from recorder import AGING, ATTACK, BIRTH, DEATH, HUNTED, STARVATION, Recorder
+from spatial import NeighborCache, greedy_matching
+from timer_wheel import TimerWheel
+from trait_stats import TraitDistribution
 
 class Colony:
     """Класс для управления колонией муравьев"""
     def __init__(self, ant_type, initial_ants, environment):
         self.ant_type = ant_type
         self.environment = environment
-        self.ants = []
+        self.ants = EntityList()
         self.next_id = 0
         
+        # Колесо таймеров для кулдаунов и старения; Simulation заменяет его общим
+        self.timers = TimerWheel()
+        # Множества допуска (словари сохраняют порядок добавления)
+        self.can_attack = {}
+        self.can_mate = {}
+        self.elderly = {}
+        # Кэш пар соседей; Simulation заменяет его общим для всех фаз тика
+        self.neighbors = NeighborCache()
+        # Журнал событий и родословная; Simulation подключает свои
+        self.recorder = None
+        self.lineage = None
+        # Гистограммы и квантили признаков, обновляемые при рождении и гибели
+        self.trait_distribution = TraitDistribution()
+        
         # Создание начальных муравьев с рандомизированными параметрами
-        for _ in range(initial_ants):
-            position = (random.randint(0, environment.width - 1),
-                       random.randint(0, environment.height - 1))
-            self.ants.append(ant_type(self.next_ant_id(), position))
+        self.spawn(initial_ants)
+    
+    def spawn(self, count, positions=None):
+        """Пакетное создание count муравьев со случайными признаками
+
+        Позиции (если не заданы), признаки и пол всех муравьев берутся
+        одной выборкой NumPy из тех же распределений, что и в конструкторе
+        муравья. Подключенные журнал событий и родословная записывают новых
+        муравьев основателями. Возвращает список новых муравьев.
+        """
+        if positions is None:
+            positions = np.column_stack((np.random.randint(0, self.environment.width, count),
+                                         np.random.randint(0, self.environment.height, count)))
+        else:
+            positions = np.asarray(positions, dtype=float)
+            if positions.shape != (count, 2):
+                raise ValueError(f"Ожидались позиции формы ({count}, 2), получено {positions.shape}")
+            if self.environment.lattice:
+                positions = snap(positions, self.environment.width, self.environment.height).astype(np.int64)
+        traits = self.ant_type.random_traits(count)
+        genders = np.random.randint(len(GENDERS), size=count)
+        # Миллионы новых объектов без циклов: сборщик мусора только повторно
+        # обходил бы их на каждом пороге выделений
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            ants = self.ant_type.bulk(self.next_id, positions, traits, genders)
+            self.next_id += count
+            self.ants.extend(ants)
+            self.ants.touch()
+            self._register_all(ants)
+        finally:
+            if collecting:
+                gc.enable()
+        self.trait_distribution.add_columns({name: traits[:, TRAITS.index(name)]
+                                             for name in self.trait_distribution.traits})
+        if self.recorder or self.lineage:
+            ids = np.arange(self.next_id - count, self.next_id, dtype=np.int64)
+            if self.recorder:
+                self.recorder.log(BIRTH, self.recorder.group_of(self.ant_type), ids)
+            if self.lineage:
+                self.lineage.record(Recorder.group_of(self.ant_type), ids)
+        return ants
     
     def next_ant_id(self):
         """Генерация уникального ID для нового муравья"""
@@ -20,48 +83,206 @@ class Colony:
         self.next_id += 1
         return ant_id
     
+    def set_timers(self, timers):
+        """Переход на общее колесо таймеров симуляции"""
+        self.timers = timers
+        self.can_attack.clear()
+        self.can_mate.clear()
+        self.elderly.clear()
+        self._register_all([ant for ant in self.ants if ant.alive])
+    
+    def _register_all(self, ants):
+        """Постановка новых муравьев в множества допуска и на таймеры
+
+        Муравьи с одинаковым сроком начала старения ставятся на колесо
+        одним событием со списком муравьев.
+        """
+        aging = {}
+        for ant in ants:
+            if ant.attack_cooldown > 0:
+                self.timers.schedule(ant.attack_cooldown, (self, 'attack', ant))
+            else:
+                self.can_attack[ant] = None
+            if ant.reproduction_cooldown > 0:
+                self.timers.schedule(ant.reproduction_cooldown, (self, 'mate', ant))
+            else:
+                self.can_mate[ant] = None
+            # Старение начинается на тике, когда возраст превысит aging_age
+            if ant.age > ant.aging_age:
+                self.elderly[ant] = None
+            else:
+                aging.setdefault(ant.aging_age + 1 - ant.age, []).append(ant)
+        for delay, group in aging.items():
+            self.timers.schedule(delay, (self, 'aging', group))
+    
+    def _unregister(self, ant):
+        """Удаление погибшего муравья из множеств допуска"""
+        self.can_attack.pop(ant, None)
+        self.can_mate.pop(ant, None)
+        self.elderly.pop(ant, None)
+    
+    def _start_attack_cooldown(self, ant):
+        """Муравей атаковал: исключаем из атакующих до конца кулдауна"""
+        del self.can_attack[ant]
+        self.timers.schedule(ant.attack_cooldown, (self, 'attack', ant))
+    
+    def _start_reproduction_cooldown(self, ant):
+        """Муравей размножился: исключаем из кандидатов до конца кулдауна"""
+        del self.can_mate[ant]
+        self.timers.schedule(ant.reproduction_cooldown, (self, 'mate', ant))
+    
+    def on_timer(self, kind, ant):
+        """Обработка наступившего события колеса таймеров"""
+        if kind == 'aging':
+            # Событие старения относится к списку муравьев, поставленных вместе
+            for member in ant:
+                if member.alive:
+                    self.elderly[member] = None
+            return
+        if not ant.alive:
+            return
+        if kind == 'attack':
+            ant.attack_cooldown = 0
+            self.can_attack[ant] = None
+        elif kind == 'mate':
+            ant.reproduction_cooldown = 0
+            self.can_mate[ant] = None
+    
     def update(self, creature_manager=None):
         """Обновление состояния колонии"""
-        # Обновление всех муравьев
-        for ant in self.ants:
-            ant.update(self.environment, self, creature_manager)
+        # Старение только для муравьев, достигших возраста старости
+        for ant in self.elderly:
+            ant.health -= ant.aging_damage
         
-        # Удаление мертвых муравьев
-        self.ants = [ant for ant in self.ants if ant.alive]
+        # Обновление всех муравьев с запоминанием погибших
+        dead_indices = []
+        for index, ant in enumerate(self.ants):
+            was_alive = ant.alive
+            ant.update(self.environment, self)
+            if not ant.alive:
+                dead_indices.append(index)
+                self._unregister(ant)
+                if was_alive and self.recorder:
+                    self._log_death(ant, STARVATION if ant.food <= 0 else AGING)
         
-        # Размножение
-        processed_ants = set()
-        new_ants = []
+        # Охота на мирных существ - только для муравьев без кулдауна атаки
+        if creature_manager:
+            self._hunt_peaceful(creature_manager.peaceful_creatures)
         
-        for ant in self.ants:
-            if ant.ant_id not in processed_ants and ant.alive and ant.food >= 70:
-                mate = ant.find_mate(self)
-                if mate and mate.ant_id not in processed_ants:
-                    new_ant = ant.reproduce_with_partner(self, mate)
-                    if new_ant:
-                        new_ants.append(new_ant)
-                        processed_ants.add(ant.ant_id)
-                        processed_ants.add(mate.ant_id)
+        # Размножение - только среди муравьев без кулдауна размножения
+        new_ants = self._reproduce()
         
-        self.ants.extend(new_ants)
+        # Новорожденные занимают места погибших
+        self.trait_distribution.remove([self.ants[index] for index in dead_indices])
+        self.trait_distribution.add(new_ants)
+        self.ants.compact(dead_indices, new_ants)
+        self._register_all(new_ants)
+    
+    def _hunt_peaceful(self, creatures):
+        """Охота готовых к атаке муравьев на мирных существ
+
+        Каждый муравей бьет первое живое существо в пределах внимательности;
+        кандидаты берутся из общего кэша пар соседей.
+        """
+        if not self.can_attack or not len(creatures):
+            return
+        awareness = self.ants.column('awareness')
+        hunters, prey, distance_sq = self.neighbors.pairs(self.ants, creatures, awareness.max())
+        keep = (distance_sq <= awareness[hunters] ** 2) & creatures.alive[prey]
+        hunters, prey = hunters[keep], prey[keep]
+        order = np.lexsort((prey, hunters))
+        
+        previous = -1
+        for hunter, victim in zip(hunters[order].tolist(), prey[order].tolist()):
+            ant = self.ants[hunter]
+            if hunter == previous or not ant.alive or ant.attack_cooldown > 0 or not creatures.alive[victim]:
+                continue
+            previous = hunter
+            ant.attack_cooldown = ant.attack_delay
+            self._start_attack_cooldown(ant)
+            if self.recorder:
+                self.recorder.log(ATTACK, self.recorder.group_of(self.ant_type), ant.ant_id,
+                                  creatures.ids[victim], self.recorder.group_of(creatures.species), ant.damage)
+            # Если существо умерло от этой атаки, получаем пищу
+            if creatures.receive_damage(victim, ant.damage):
+                ant.food += 30 * float(creatures.size[victim])
+                if self.recorder:
+                    self.recorder.log(DEATH, self.recorder.group_of(creatures.species), creatures.ids[victim],
+                                      extra=HUNTED)
+    
+    def _reproduce(self):
+        """Пакетное размножение всех подходящих пар колонии
+
+        Пары подбираются одним сопоставлением самцов и самок, готовых к
+        размножению, по парам соседей из общего кэша; признаки, пол и
+        позиции потомков вычисляются операциями над массивами.
+        """
+        ant_type = self.ant_type
+        if not self.can_mate:
+            return []
+        ants = self.ants
+        eligible = ants.mask(lambda ant: ant.alive and ant.reproduction_cooldown == 0 and
+                             ant.food >= ant_type.mating_food)
+        male = ants.mask(lambda ant: ant.gender is MALE)
+        
+        male_index, female_index, distance_sq = self.neighbors.pairs(ants, ants, ant_type.mating_distance)
+        keep = eligible[male_index] & eligible[female_index] & male[male_index] & ~male[female_index]
+        male_index, female_index = greedy_matching(male_index[keep], female_index[keep], distance_sq[keep])
+        if not len(male_index):
+            return []
+        fathers = [ants[i] for i in male_index.tolist()]
+        mothers = [ants[i] for i in female_index.tolist()]
+        born = len(fathers)
+        
+        # Усреднение признаков родителей и мутация с вероятностью mutation_chance
+        father_traits = np.array([[getattr(ant, name) for name in TRAITS] for ant in fathers])
+        mother_traits = np.array([[getattr(ant, name) for name in TRAITS] for ant in mothers])
+        traits = (father_traits + mother_traits) / 2
+        mutated = np.random.random(traits.shape) < ant_type.mutation_chance
+        traits[mutated] *= np.random.uniform(1.0 - ant_type.mutation_range, 1.0 + ant_type.mutation_range,
+                                             mutated.sum())
+        
+        # Позиция рядом с родителями и случайный пол
+        positions = (np.array([ant.position for ant in fathers]) + np.array([ant.position for ant in mothers])) / 2
+        positions += np.random.randint(-2, 3, size=(born, 2))
+        positions[:, 0] = np.clip(positions[:, 0], 0, self.environment.width - 1)
+        positions[:, 1] = np.clip(positions[:, 1], 0, self.environment.height - 1)
+        if self.environment.lattice:
+            positions = np.rint(positions).astype(np.int64)
+        genders = np.random.randint(len(GENDERS), size=born)
+        
+        # Родители тратят еду и уходят на кулдаун
+        for parent in fathers + mothers:
+            parent.food -= ant_type.mating_cost
+            parent.reproduction_cooldown = parent.reproduction_delay
+            self._start_reproduction_cooldown(parent)
+        
+        children = [
+            ant_type(self.next_ant_id(), position, *trait_values, GENDERS[gender])
+            for position, trait_values, gender in zip(positions.tolist(), traits.tolist(), genders.tolist())
+        ]
+        if self.recorder or self.lineage:
+            child_ids = [ant.ant_id for ant in children]
+            father_ids = [ant.ant_id for ant in fathers]
+            mother_ids = [ant.ant_id for ant in mothers]
+            if self.recorder:
+                self.recorder.log(BIRTH, self.recorder.group_of(ant_type), child_ids, father_ids, mother_ids)
+            if self.lineage:
+                self.lineage.record(Recorder.group_of(ant_type), child_ids, father_ids, mother_ids)
+        return children
     
     def move_ants(self):
         """Передвижение всех муравьев колонии"""
         for ant in self.ants:
+            was_alive = ant.alive
             ant.move(self.environment)
+            if was_alive and not ant.alive and self.recorder:
+                self._log_death(ant, STARVATION)
+        self.ants.touch()
     
-    def attack_enemies(self, enemy_colony):
-        """Атака вражеских муравьев"""
-        for ant in self.ants:
-            # Поиск врагов поблизости
-            for enemy in enemy_colony.ants:
-                ant.attack(enemy)
-    
-    def attack_predators(self, creature_manager):
-        """Атака хищников"""
-        for ant in self.ants:
-            for predator in creature_manager.predators:
-                ant.attack_predator(predator)
+    def _log_death(self, ant, cause):
+        """Запись гибели муравья в журнал событий"""
+        self.recorder.log(DEATH, self.recorder.group_of(self.ant_type), ant.ant_id, extra=cause)
     
     def count(self):
         """Подсчет количества живых муравьев"""
@@ -73,6 +294,10 @@ class Colony:
         females = sum(1 for ant in self.ants if ant.gender == 'female')
         return {'male': males, 'female': females}
     
+    def get_trait_quantiles(self):
+        """Медиана, p10 и p90 неизменных признаков колонии за O(ячеек)"""
+        return self.trait_distribution.summary()
+    
     def get_average_stats(self):
         """Получение средних показателей колонии"""
         if not self.ants:
@@ -0,0 +1,137 @@
+import numpy as np
+
+from recorder import ATTACK, COMBAT, DEATH, PREDATOR
+from spatial import NeighborCache
+
+
+def nearest_per_attacker(attackers, targets, distance_sq):
+    """Ближайшая цель каждого атакующего из пар-кандидатов
+
+    Возвращает индексы атакующих и их целей; при равных расстояниях
+    выбирается цель с меньшим индексом.
+    """
+    order = np.lexsort((targets, distance_sq, attackers))
+    attackers, targets = attackers[order], targets[order]
+    first = np.ones(len(attackers), dtype=bool)
+    first[1:] = attackers[1:] != attackers[:-1]
+    return attackers[first], targets[first]
+
+
+def _ant_columns(ants):
+    """Маски живых и готовых к атаке муравьев, их радиусы и урон"""
+    alive = ants.mask(lambda ant: ant.alive)
+    ready = ants.mask(lambda ant: ant.alive and ant.attack_cooldown == 0)
+    return alive, ready, ants.column('awareness'), ants.column('damage')
+
+
+def _log_attacks(recorder, colony, ants, hitters, target_group, target_ids, damage):
+    """Запись ударов муравьев колонии в журнал событий"""
+    recorder.log(ATTACK, recorder.group_of(colony.ant_type), [ants[i].ant_id for i in hitters.tolist()],
+                 target_ids, target_group, damage[hitters])
+
+
+def resolve_combat(red_colony, black_colony, creature_manager=None, neighbors=None, recorder=None):
+    """Боевая фаза тика, не зависящая от порядка обхода
+
+    Сначала по парам соседей из NeighborCache собираются все намерения
+    атаки: каждый готовый к атаке муравей бьет ближайшего врага в пределах
+    внимательности, а если врагов рядом нет - ближайшего хищника; удары
+    хищников приходят из CreatureManager. Затем урон суммируется по целям и
+    применяется одновременно, так что погибшие в этом тике тоже успевают
+    ударить. Удары и гибель записываются в recorder, если он задан.
+    Возвращает число атак и погибших.
+    """
+    neighbors = neighbors if neighbors is not None else NeighborCache()
+    colonies = (red_colony, black_colony)
+    groups = (red_colony.ants, black_colony.ants)
+    columns = [_ant_columns(ants) for ants in groups]
+    damage_taken = [np.zeros(len(ants)) for ants in groups]
+    struck = [[] for _ in colonies]
+    attacks = 0
+
+    predators = creature_manager.predators if creature_manager else None
+    predator_count = predators.count if predators is not None else 0
+    predator_alive = predators.alive[:predator_count].copy() if predator_count else np.zeros(0, dtype=bool)
+    predator_damage = np.zeros(predator_count)
+
+    # Пары красных и черных считаются один раз в наибольшем радиусе обеих сторон
+    radius = max((awareness.max() for _, _, awareness, _ in columns if len(awareness)), default=0)
+    enemy_pairs = neighbors.pairs(groups[0], groups[1], radius)
+
+    for side, enemy_side in ((0, 1), (1, 0)):
+        _, ready, awareness, damage = columns[side]
+        enemy_alive = columns[enemy_side][0]
+        if side == 0:
+            attackers, targets, distance_sq = enemy_pairs
+        else:
+            targets, attackers, distance_sq = enemy_pairs
+
+        # Удары по вражеским муравьям
+        keep = ready[attackers] & enemy_alive[targets] & (distance_sq <= awareness[attackers] ** 2)
+        hitters, victims = nearest_per_attacker(attackers[keep], targets[keep], distance_sq[keep])
+        np.add.at(damage_taken[enemy_side], victims, damage[hitters])
+        struck[side].extend(hitters.tolist())
+        attacks += len(hitters)
+        if recorder:
+            enemy_ants = groups[enemy_side]
+            _log_attacks(recorder, colonies[side], groups[side], hitters,
+                         recorder.group_of(colonies[enemy_side].ant_type),
+                         [enemy_ants[i].ant_id for i in victims.tolist()], damage)
+
+        # Муравьи без врага рядом бьют хищников
+        if predator_alive.any() and len(awareness):
+            idle = ready.copy()
+            idle[hitters] = False
+            attackers, targets, distance_sq = neighbors.pairs(groups[side], predators, awareness.max())
+            keep = idle[attackers] & predator_alive[targets] & (distance_sq <= awareness[attackers] ** 2)
+            hitters, victims = nearest_per_attacker(attackers[keep], targets[keep], distance_sq[keep])
+            np.add.at(predator_damage, victims, damage[hitters])
+            struck[side].extend(hitters.tolist())
+            attacks += len(hitters)
+            if recorder:
+                _log_attacks(recorder, colonies[side], groups[side], hitters,
+                             recorder.group_of(predators.species), predators.ids[victims], damage)
+
+    # Атаковавшие муравьи уходят на кулдаун
+    for colony, ants, hitters in zip(colonies, groups, struck):
+        for index in hitters:
+            ant = ants[index]
+            ant.attack_cooldown = ant.attack_delay
+            colony._start_attack_cooldown(ant)
+
+    # Одновременное применение урона
+    casualties = []
+    for ants, damage in zip(groups, damage_taken):
+        hit = np.flatnonzero(damage)
+        for index, amount in zip(hit.tolist(), damage[hit].tolist()):
+            ants[index].health -= amount
+            casualties.append((ants[index], COMBAT))
+    predator_strikes = creature_manager.take_strikes() if creature_manager else []
+    for ant, damage in predator_strikes:
+        ant.health -= damage
+        casualties.append((ant, PREDATOR))
+    attacks += len(predator_strikes)
+
+    deaths = 0
+    hunt_kills = 0
+    for ant, cause in casualties:
+        if ant.alive and ant.health <= 0:
+            ant.alive = False
+            deaths += 1
+            # Смерть приписывается первой причине, добившей муравья; хищникам засчитываются только их убийства
+            hunt_kills += cause == PREDATOR
+            if recorder:
+                recorder.log(DEATH, recorder.group_of(type(ant)), ant.ant_id, extra=cause)
+    if creature_manager:
+        creature_manager.hunt_kills += hunt_kills
+
+    if predator_count:
+        predators.health[:predator_count] -= predator_damage
+        killed = predator_alive & (predator_damage > 0) & (predators.health[:predator_count] <= 0)
+        predators.alive[:predator_count][killed] = False
+        deaths += int(killed.sum())
+        if recorder:
+            recorder.log(DEATH, recorder.group_of(predators.species), predators.ids[:predator_count][killed],
+                         extra=COMBAT)
+
+    return {'attacks': attacks, 'deaths': deaths}
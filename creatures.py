@@ -1,12 +1,23 @@
 import random
 import numpy as np
 
+from recorder import ATTACK, BIRTH
+from spatial import NeighborCache
+
+
 class Creature:
     """Базовый класс для существ в симуляции"""
+
+    __slots__ = ('creature_id', 'position', 'health', 'damage', 'speed', 'size', 'alive', 'age')
+
+    color = "gray"
+    aging_age = 100     # После этого возраста здоровье убывает
+    aging_damage = 0.2  # Потеря здоровья за тик от старости
     
     def __init__(self, creature_id, position, health=100, damage=0, speed=1, size=1):
         self.creature_id = creature_id
-        self.position = position
+        # Позиция изменяется на месте, чтобы не создавать кортеж на каждом шаге
+        self.position = [position[0], position[1]]
         self.health = health
         self.damage = damage
         self.speed = speed
@@ -28,7 +39,8 @@ class Creature:
         
         # Проверка границ среды
         if 0 <= new_x < environment.width and 0 <= new_y < environment.height:
-            self.position = (new_x, new_y)
+            self.position[0] = new_x
+            self.position[1] = new_y
     
     def receive_damage(self, damage):
         """Получение урона"""
@@ -40,202 +52,397 @@ class Creature:
             self.alive = False
     
     def update(self, environment):
-        """Обновление состояния существа"""
+        """Обновление состояния существа
+
+        В симуляции возраст и потерю здоровья от старости применяет
+        CreatureStore.grow_older на каждом тике.
+        """
         if not self.alive:
             return
             
         self.age += 1
-        
-        # Естественное старение
-        if self.age > 100:
-            self.health -= 0.2
 
 
 class PeacefulCreature(Creature):
     """Мирное существо, служащее пищей для муравьев"""
+
+    __slots__ = ()
+
+    color = "blue"
+    reproduction_rate = 0.02  # 2% шанс размножения при каждом обновлении
     
     def __init__(self, creature_id, position, health=50, speed=0.8, size=3):
         super().__init__(creature_id, position, health=health, damage=0, speed=speed, size=size)
-        self.color = "blue"
-        self.reproduction_rate = 0.02  # 2% шанс размножения при каждом обновлении
-    
-    def reproduce(self, environment, creature_manager):
-        """Размножение мирных существ"""
-        if not self.alive or self.age < 20:  # Только взрослые могут размножаться
-            return None
-            
-        if random.random() < self.reproduction_rate:
-            # Определение нового положения рядом с родителем
-            new_position = (
-                max(0, min(environment.width - 1, self.position[0] + random.randint(-3, 3))),
-                max(0, min(environment.height - 1, self.position[1] + random.randint(-3, 3)))
-            )
-            
-            health = self.health * random.uniform(0.9, 1.1)
-            speed = self.speed * random.uniform(0.9, 1.1)
-            size = self.size * random.uniform(0.9, 1.1)
-            
-            return PeacefulCreature(creature_manager.next_creature_id(), new_position, health, speed, size)
-        return None
 
 
 class Predator(Creature):
     """Хищник, который охотится на муравьев"""
+
+    __slots__ = ('hunt_cooldown',)
+
+    color = "purple"
+    awareness = 15  # Радиус обнаружения добычи
+    hunt_delay = 5  # Кулдаун между атаками
+    reproduction_rate = 0.01  # 1% шанс размножения
     
     def __init__(self, creature_id, position, health=300, damage=50, speed=1.5, size=5):
         super().__init__(creature_id, position, health=health, damage=damage, speed=speed, size=size)
-        self.color = "purple"
-        self.awareness = 15  # Радиус обнаружения добычи
         self.hunt_cooldown = 0
-        self.reproduction_rate = 0.01  # 1% шанс размножения
-    
-    def move(self, environment, red_ants=None, black_ants=None):
-        """Передвижение хищника с охотой на муравьев"""
-        if not self.alive:
+
+
+# Восемь направлений случайного шага
+DIRECTIONS = np.array([(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)], dtype=float)
+
+
+class CreatureStore:
+    """Массивное хранилище существ одного вида
+
+    Позиции и характеристики лежат в массивах NumPy, поэтому движение,
+    старение и размножение выполняются одной операцией на весь вид.
+    Итерация по хранилищу отдает индексы живых существ, а len - их число;
+    характеристики меняются только через массивы по этим индексам.
+    """
+
+    FIELDS = ('ids', 'position', 'health', 'damage', 'speed', 'size', 'age', 'alive', 'hunt_ready',
+              'target', 'retarget_at')
+
+    def __init__(self, species, capacity=64):
+        self.species = species
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.position = np.zeros((capacity, 2))
+        self.health = np.zeros(capacity)
+        self.damage = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.size = np.zeros(capacity)
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.hunt_ready = np.zeros(capacity, dtype=np.int64)  # Тик, с которого разрешена атака
+        self.target = np.full(capacity, None, dtype=object)  # Отслеживаемая добыча
+        self.retarget_at = np.zeros(capacity, dtype=np.int64)  # Тик следующего полного поиска цели
+        self.version = 0  # Растет при движении и смене состава (для NeighborCache)
+
+    def __len__(self):
+        """Число живых существ (мертвые ячейки до удаления не считаются)"""
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def positions(self):
+        """Позиции всех существ хранилища, включая еще не удаленных мертвых"""
+        return self.position[:self.count]
+
+    def __iter__(self):
+        """Индексы живых существ в массивах хранилища"""
+        return iter(np.flatnonzero(self.alive[:self.count]).tolist())
+
+    def materialize(self, index):
+        """Отдельная копия существа index в виде объекта species; ее изменения в хранилище не попадают"""
+        creature = object.__new__(self.species)
+        Creature.__init__(creature, int(self.ids[index]), self.position[index].tolist(),
+                          health=float(self.health[index]), damage=float(self.damage[index]),
+                          speed=float(self.speed[index]), size=float(self.size[index]))
+        creature.age = int(self.age[index])
+        creature.alive = bool(self.alive[index])
+        if isinstance(creature, Predator):
+            creature.hunt_cooldown = 0
+        return creature
+
+    def _reserve(self, capacity):
+        """Увеличение емкости массивов не менее чем до capacity"""
+        if capacity <= len(self.ids):
             return
-            
-        if self.hunt_cooldown > 0:
-            self.hunt_cooldown -= 1
-        
-        # Проверка наличия муравьев поблизости для охоты
-        target = None
-        target_distance = float('inf')
-        
-        # Проверяем красных муравьев
-        if red_ants:
-            for ant in red_ants:
-                if not ant.alive:
-                    continue
-                dist = np.sqrt((self.position[0] - ant.position[0])**2 + (self.position[1] - ant.position[1])**2)
-                if dist < self.awareness and dist < target_distance:
-                    target = ant
-                    target_distance = dist
-        
-        # Проверяем черных муравьев
-        if black_ants:
-            for ant in black_ants:
-                if not ant.alive:
-                    continue
-                dist = np.sqrt((self.position[0] - ant.position[0])**2 + (self.position[1] - ant.position[1])**2)
-                if dist < self.awareness and dist < target_distance:
-                    target = ant
-                    target_distance = dist
-        
-        # Если есть цель, двигаемся к ней
-        if target and target.alive:
-            direction_x = target.position[0] - self.position[0]
-            direction_y = target.position[1] - self.position[1]
-            
-            # Нормализуем направление
-            length = max(0.1, np.sqrt(direction_x**2 + direction_y**2))
-            direction_x /= length
-            direction_y /= length
-            
-            new_x = self.position[0] + direction_x * self.speed
-            new_y = self.position[1] + direction_y * self.speed
-            
-            # Проверка границ среды
-            new_x = max(0, min(environment.width - 1, new_x))
-            new_y = max(0, min(environment.height - 1, new_y))
-            
-            self.position = (new_x, new_y)
-            
-            # Атакуем, если мы достаточно близко
-            if target_distance < 1.5:
-                if self.hunt_cooldown == 0:
-                    target.receive_damage(self.damage)
-                    self.hunt_cooldown = 5  # Кулдаун между атаками
-        else:
-            # Случайное движение, если нет цели
-            super().move(environment)
-    
-    def reproduce(self, environment, creature_manager):
-        """Размножение хищников"""
-        if not self.alive or self.health < 200 or self.age < 50:  # Только здоровые и взрослые
-            return None
-            
-        if random.random() < self.reproduction_rate:
-            # Определение нового положения рядом с родителем
-            new_position = (
-                max(0, min(environment.width - 1, self.position[0] + random.randint(-3, 3))),
-                max(0, min(environment.height - 1, self.position[1] + random.randint(-3, 3)))
-            )
-            
-            health = self.health * random.uniform(0.9, 1.1)
-            damage = self.damage * random.uniform(0.9, 1.1)
-            speed = self.speed * random.uniform(0.9, 1.1)
-            size = self.size * random.uniform(0.9, 1.1)
-            
-            return Predator(creature_manager.next_creature_id(), new_position, health, damage, speed, size)
-        return None
+        capacity = max(capacity, 2 * len(self.ids))
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            if old.dtype == object:
+                new.fill(None)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, ids, position, health, damage, speed, size):
+        """Пакетное добавление существ; скаляры растягиваются на всю пачку"""
+        added = len(ids)
+        start, end = self.count, self.count + added
+        self._reserve(end)
+        self.ids[start:end] = ids
+        self.position[start:end] = position
+        self.health[start:end] = health
+        self.damage[start:end] = damage
+        self.speed[start:end] = speed
+        self.size[start:end] = size
+        self.age[start:end] = 0
+        self.alive[start:end] = True
+        self.hunt_ready[start:end] = 0
+        self.target[start:end] = None
+        self.retarget_at[start:end] = 0
+        self.count = end
+        self.version += 1
+
+    def remove_dead(self):
+        """Удаление мертвых: на их места переносятся живые с конца массивов"""
+        dead = np.flatnonzero(~self.alive[:self.count])
+        if not len(dead):
+            return
+        new_count = self.count - len(dead)
+        # Дыры в начале закрываем живыми из хвоста
+        holes = dead[dead < new_count]
+        tail = np.arange(new_count, self.count)
+        movers = tail[self.alive[new_count:self.count]]
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[holes] = array[movers]
+        # Не держим ссылки на добычу в освободившемся хвосте
+        self.target[new_count:self.count] = None
+        self.count = new_count
+        self.version += 1
+
+    def receive_damage(self, index, damage):
+        """Урон существу index; возвращает True, если оно погибло"""
+        if not self.alive[index]:
+            return False
+        self.health[index] -= damage
+        if self.health[index] <= 0:
+            self.alive[index] = False
+            return True
+        return False
+
+    def random_walk(self, environment, mask=None):
+        """Случайный шаг всех (или отмеченных mask) существ"""
+        indices = np.flatnonzero(self.alive[:self.count] if mask is None else mask)
+        steps = DIRECTIONS[np.random.randint(len(DIRECTIONS), size=len(indices))]
+        new_position = self.position[indices] + steps * self.speed[indices, None]
+        if environment.lattice:
+            new_position = np.rint(new_position)
+        # Шаг за границу среды не выполняется
+        inside = ((new_position[:, 0] >= 0) & (new_position[:, 0] < environment.width) &
+                  (new_position[:, 1] >= 0) & (new_position[:, 1] < environment.height))
+        self.position[indices[inside]] = new_position[inside]
+        self.version += 1
+
+    def grow_older(self):
+        """Увеличение возраста и естественное старение"""
+        alive = self.alive[:self.count]
+        self.age[:self.count] += alive
+        elderly = alive & (self.age[:self.count] > self.species.aging_age)
+        self.health[:self.count][elderly] -= self.species.aging_damage
+
+    def breed(self, environment, manager, eligible, traits):
+        """Размножение: розыгрыш Бернулли и мутация признаков одной операцией
+
+        traits - характеристики, наследуемые с мутацией ±10%.
+        """
+        parents = np.flatnonzero(eligible & (np.random.random(self.count) < self.species.reproduction_rate))
+        if not len(parents):
+            return
+        born = len(parents)
+        offsets = np.random.randint(-3, 4, size=(born, 2))
+        position = self.position[parents] + offsets
+        position[:, 0] = np.clip(position[:, 0], 0, environment.width - 1)
+        position[:, 1] = np.clip(position[:, 1], 0, environment.height - 1)
+        inherited = {
+            name: getattr(self, name)[parents] * (np.random.uniform(0.9, 1.1, born) if name in traits else 1)
+            for name in ('health', 'damage', 'speed', 'size')
+        }
+        ids = manager.next_creature_ids(born)
+        self.add(ids, position, **inherited)
+        if manager.recorder:
+            manager.recorder.log(BIRTH, manager.recorder.group_of(self.species), ids, self.ids[parents])
 
 
 class CreatureManager:
     """Класс для управления различными существами в симуляции"""
-    
-    def __init__(self, environment):
+
+    def __init__(self, environment, retarget_interval=1):
         self.environment = environment
-        self.peaceful_creatures = []
-        self.predators = []
+        self.peaceful_creatures = CreatureStore(PeacefulCreature)
+        self.predators = CreatureStore(Predator)
         self.next_id = 0
-    
+        self.tick = 0  # Собственный счетчик тиков для кулдаунов охоты
+        # Хищник держит цель и ищет новую не чаще, чем раз в retarget_interval тиков;
+        # 1 - полный поиск на каждом тике
+        self.retarget_interval = retarget_interval
+        # Итоги охоты: число атак хищников и убитых ими муравьев
+        self.hunt_strikes = 0
+        self.hunt_kills = 0
+        # Удары хищников за текущий тик: (муравей, урон); применяются в боевой фазе
+        self.strikes = []
+        # Кэш пар соседей; Simulation заменяет его общим для всех фаз тика
+        self.neighbors = NeighborCache()
+        # Журнал событий; Simulation подключает свой
+        self.recorder = None
+
     def next_creature_id(self):
         """Генерация уникального ID для нового существа"""
         creature_id = self.next_id
         self.next_id += 1
         return creature_id
-    
+
+    def next_creature_ids(self, count):
+        """Пачка последовательных ID для новых существ"""
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        return ids
+
+    def _random_positions(self, count):
+        """Случайные целочисленные позиции внутри среды"""
+        return np.column_stack((np.random.randint(0, self.environment.width, count),
+                                np.random.randint(0, self.environment.height, count)))
+
     def add_peaceful_creatures(self, count):
         """Добавление мирных существ в симуляцию"""
-        for _ in range(count):
-            position = (random.randint(0, self.environment.width - 1),
-                       random.randint(0, self.environment.height - 1))
-            self.peaceful_creatures.append(PeacefulCreature(self.next_creature_id(), position))
-    
+        self.peaceful_creatures.add(self.next_creature_ids(count), self._random_positions(count),
+                                    health=50, damage=0, speed=0.8, size=3)
+
     def add_predators(self, count):
         """Добавление хищников в симуляцию"""
-        for _ in range(count):
-            position = (random.randint(0, self.environment.width - 1),
-                       random.randint(0, self.environment.height - 1))
-            self.predators.append(Predator(self.next_creature_id(), position))
-    
+        self.predators.add(self.next_creature_ids(count), self._random_positions(count),
+                           health=300, damage=50, speed=1.5, size=5)
+
     def update(self, red_ants=None, black_ants=None):
         """Обновление всех существ"""
-        # Обновление мирных существ
-        for creature in self.peaceful_creatures:
-            creature.update(self.environment)
-            creature.move(self.environment)
+        self.tick += 1
+
+        # Мирные существа: старение, случайное движение, размножение взрослых
+        peaceful = self.peaceful_creatures
+        peaceful.grow_older()
+        peaceful.random_walk(self.environment)
+        adults = peaceful.alive[:peaceful.count] & (peaceful.age[:peaceful.count] >= 20)
+        peaceful.breed(self.environment, self, adults, traits=('health', 'speed', 'size'))
+
+        # Хищники: старение, охота, размножение здоровых взрослых
+        predators = self.predators
+        predators.grow_older()
+        self._hunt([ants for ants in (red_ants, black_ants) if ants])
+        healthy = (predators.alive[:predators.count] & (predators.health[:predators.count] >= 200) &
+                   (predators.age[:predators.count] >= 50))
+        predators.breed(self.environment, self, healthy, traits=('health', 'damage', 'speed', 'size'))
+
+        # Удаление мертвых существ
+        peaceful.remove_dead()
+        predators.remove_dead()
+
+    def _hunt(self, groups):
+        """Погоня хищников за муравьями и атака
+
+        Хищник преследует отслеживаемую цель, пока она жива, остается в
+        радиусе обнаружения и не подошел срок повторного поиска. Остальные
+        хищники выбирают ближайшего муравья из групп groups (EntityList
+        колоний) по парам из общего NeighborCache; хищники без цели делают
+        случайный шаг.
+        """
+        predators = self.predators
+        alive = predators.alive[:predators.count].copy()
+        hunters = np.flatnonzero(alive)
+        targets = predators.target[hunters]
+        target_distance = np.full(len(hunters), np.inf)
         
-        # Размножение мирных существ
-        new_peaceful = []
-        for creature in self.peaceful_creatures:
-            new_creature = creature.reproduce(self.environment, self)
-            if new_creature:
-                new_peaceful.append(new_creature)
+        # Проверка отслеживаемых целей - O(хищников)
+        for k, index in enumerate(hunters):
+            ant = targets[k]
+            if ant is None or not ant.alive or predators.retarget_at[index] <= self.tick:
+                targets[k] = None
+                continue
+            dx = ant.position[0] - predators.position[index, 0]
+            dy = ant.position[1] - predators.position[index, 1]
+            distance = (dx * dx + dy * dy) ** 0.5
+            if distance < Predator.awareness:
+                target_distance[k] = distance
+            else:
+                targets[k] = None
         
-        self.peaceful_creatures.extend(new_peaceful)
+        # Полный поиск только для хищников, потерявших цель
+        rescan = np.flatnonzero(~np.isfinite(target_distance))
+        if len(rescan) and groups:
+            for k, ant, distance in self._nearest_ants(hunters[rescan], rescan, groups):
+                targets[k] = ant
+                target_distance[k] = distance
+            predators.retarget_at[hunters[rescan]] = self.tick + self.retarget_interval
+        predators.target[hunters] = targets
         
-        # Обновление хищников
-        for predator in self.predators:
-            predator.update(self.environment)
-            predator.move(self.environment, red_ants, black_ants)
+        chasing = np.isfinite(target_distance)
+        wandering = alive
+        wandering[hunters[chasing]] = False
+        predators.random_walk(self.environment, wandering)
+        if not chasing.any():
+            return
         
-        # Размножение хищников
-        new_predators = []
-        for predator in self.predators:
-            new_predator = predator.reproduce(self.environment, self)
-            if new_predator:
-                new_predators.append(new_predator)
+        # Движение к цели с нормализованным направлением
+        chasers = hunters[chasing]
+        prey = targets[chasing]
+        prey_positions = np.array([ant.position for ant in prey])
+        direction = prey_positions - predators.position[chasers]
+        length = np.maximum(0.1, np.sqrt((direction ** 2).sum(axis=1)))
+        new_position = predators.position[chasers] + direction / length[:, None] * predators.speed[chasers, None]
+        new_position[:, 0] = np.clip(new_position[:, 0], 0, self.environment.width - 1)
+        new_position[:, 1] = np.clip(new_position[:, 1], 0, self.environment.height - 1)
+        if self.environment.lattice:
+            new_position = np.rint(new_position)
+        predators.position[chasers] = new_position
+        predators.version += 1
         
-        self.predators.extend(new_predators)
+        # Атака, если цель была достаточно близко и охота не на кулдауне;
+        # урон применяется позже, одновременно с остальными ударами тика
+        striking = (target_distance[chasing] < 1.5) & (predators.hunt_ready[chasers] <= self.tick)
+        strikers = chasers[striking]
+        predators.hunt_ready[strikers] = self.tick + Predator.hunt_delay
+        self.strikes.extend(zip(prey[striking].tolist(), predators.damage[strikers].tolist()))
+        self.hunt_strikes += len(strikers)
+        if self.recorder:
+            struck = prey[striking].tolist()
+            self.recorder.log(ATTACK, self.recorder.group_of(Predator), predators.ids[strikers],
+                              [ant.ant_id for ant in struck], [self.recorder.group_of(type(ant)) for ant in struck],
+                              predators.damage[strikers])
+    
+    def take_strikes(self):
+        """Забрать накопленные удары хищников для боевой фазы"""
+        strikes, self.strikes = self.strikes, []
+        return strikes
+    
+    def apply_strikes(self):
+        """Немедленное применение ударов хищников (без общей боевой фазы)"""
+        strikes = self.take_strikes()
+        for ant, damage in strikes:
+            ant.receive_damage(damage)
+        self.hunt_kills += len({ant for ant, _ in strikes if not ant.alive})
+    
+    def _nearest_ants(self, hunters, slots, groups):
+        """Ближайший живой муравей в радиусе обнаружения для хищников hunters
+
+        Возвращает тройки (slot, муравей, расстояние), где slot - элемент
+        slots, соответствующий хищнику. При равных расстояниях выигрывает
+        муравей первой группы.
+        """
+        predators = self.predators
+        searching = np.zeros(predators.count, dtype=bool)
+        searching[hunters] = True
+        slot_of = np.zeros(predators.count, dtype=np.int64)
+        slot_of[hunters] = slots
         
-        # Удаление мертвых существ
-        self.peaceful_creatures = [c for c in self.peaceful_creatures if c.alive]
-        self.predators = [p for p in self.predators if p.alive]
+        found = []
+        for group_index, group in enumerate(groups):
+            predator_index, ant_index, distance_sq = self.neighbors.pairs(predators, group, Predator.awareness)
+            keep = searching[predator_index] & (distance_sq < Predator.awareness ** 2)
+            predator_index, ant_index, distance_sq = predator_index[keep], ant_index[keep], distance_sq[keep]
+            alive = np.fromiter((group[i].alive for i in ant_index.tolist()), dtype=bool, count=len(ant_index))
+            found.append((predator_index[alive], np.full(alive.sum(), group_index), ant_index[alive],
+                          distance_sq[alive]))
+        predator_index, group_index, ant_index, distance_sq = (np.concatenate(columns) for columns in zip(*found))
+        
+        # Первая запись каждого хищника после сортировки - ближайший муравей
+        order = np.lexsort((ant_index, group_index, distance_sq, predator_index))
+        predator_index, group_index, ant_index, distance_sq = (
+            predator_index[order], group_index[order], ant_index[order], distance_sq[order])
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = predator_index[1:] != predator_index[:-1]
+        return [
+            (slot_of[p], groups[g][a], d ** 0.5)
+            for p, g, a, d in zip(predator_index[first].tolist(), group_index[first].tolist(),
+                                  ant_index[first].tolist(), distance_sq[first].tolist())
+        ]
     
     def count(self):
         """Подсчет количества существ каждого типа"""
         return {
             'peaceful': len(self.peaceful_creatures),
             'predators': len(self.predators)
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,122 @@
+import numpy as np
+
+# Группы сущностей и их цвета (как в SimulationCanvas)
+GROUP_COLORS = {
+    'red': (255, 0, 0),
+    'black': (0, 0, 0),
+    'peaceful': (0, 0, 255),
+    'predators': (150, 0, 150),
+}
+COLONIES = ('red', 'black')
+
+# Режимы отображения сущностей
+POINTS, DENSITY, TERRITORY, AUTO = 'points', 'density', 'territory', 'auto'
+VIEW_MODES = (AUTO, POINTS, DENSITY, TERRITORY)
+
+# Число сущностей, начиная с которого режим AUTO показывает плотность вместо точек
+AGGREGATE_THRESHOLD = 2000
+
+
+def group_positions(simulation):
+    """Позиции живых сущностей каждой группы: словарь массивов (N, 2)"""
+    positions = {
+        'red': simulation.red_colony.ants.positions(),
+        'black': simulation.black_colony.ants.positions(),
+    }
+    creature_manager = simulation.creature_manager
+    for group, store in (('peaceful', creature_manager and creature_manager.peaceful_creatures),
+                         ('predators', creature_manager and creature_manager.predators)):
+        if store:
+            positions[group] = store.positions()[store.alive[:store.count]]
+        else:
+            positions[group] = np.zeros((0, 2))
+    return positions
+
+
+def density_grid(positions, width, height, cell=1):
+    """Число сущностей в квадратах cell x cell среды, массив (столбцы, строки)"""
+    columns, rows = -(-width // cell), -(-height // cell)
+    if not len(positions):
+        return np.zeros((columns, rows), dtype=np.int64)
+    x = np.clip((positions[:, 0] // cell).astype(np.int64), 0, columns - 1)
+    y = np.clip((positions[:, 1] // cell).astype(np.int64), 0, rows - 1)
+    return np.bincount(x * rows + y, minlength=columns * rows).reshape(columns, rows)
+
+
+class DensityOverlay:
+    """Плотность групп и территории колоний одним изображением
+
+    Для каждой группы сущностей считается сетка плотности одним
+    bincount, а территория клетки - колония с наибольшим числом муравьев
+    в ней (-1, если муравьев нет). Результат отдается как RGBA-изображение
+    (строки по y, столбцы по x, 4) uint8, которое рисуется одним слоем,
+    поэтому стоимость отрисовки не зависит от численности. Сетки
+    пересчитываются только при смене дня или состава колоний.
+    """
+
+    def __init__(self, simulation, cell=2, threshold=AGGREGATE_THRESHOLD, mode=AUTO):
+        if mode not in VIEW_MODES:
+            raise ValueError(f"Неизвестный режим отображения: {mode}")
+        self.simulation = simulation
+        self.cell = cell
+        self.threshold = threshold
+        self.mode = mode
+        # Размер сетки; последние квадраты могут выходить за край среды
+        self.columns = -(-simulation.environment.width // cell)
+        self.rows = -(-simulation.environment.height // cell)
+        self._key = None
+        self.grids = {}
+
+    def entity_count(self):
+        simulation = self.simulation
+        count = len(simulation.red_colony.ants) + len(simulation.black_colony.ants)
+        if simulation.creature_manager:
+            counts = simulation.creature_manager.count()
+            count += counts['peaceful'] + counts['predators']
+        return count
+
+    def active_mode(self):
+        """Режим для текущего кадра; AUTO выбирает по числу сущностей"""
+        if self.mode != AUTO:
+            return self.mode
+        return DENSITY if self.entity_count() > self.threshold else POINTS
+
+    def update(self):
+        """Пересчет сеток плотности, если состояние симуляции изменилось"""
+        simulation = self.simulation
+        key = (simulation.day, id(simulation.environment),
+               simulation.red_colony.ants.version, simulation.black_colony.ants.version)
+        if key == self._key:
+            return self.grids
+        width, height = simulation.environment.width, simulation.environment.height
+        self.grids = {group: density_grid(positions, width, height, self.cell)
+                      for group, positions in group_positions(simulation).items()}
+        self._key = key
+        return self.grids
+
+    def territory(self):
+        """Номер колонии (индекс COLONIES), преобладающей в клетке, или -1"""
+        grids = self.update()
+        stacked = np.stack([grids[colony] for colony in COLONIES])
+        return np.where(stacked.sum(axis=0) > 0, stacked.argmax(axis=0), -1)
+
+    def image(self, mode=None):
+        """RGBA-изображение режима DENSITY или TERRITORY"""
+        mode = mode or self.active_mode()
+        grids = self.update()
+        if mode == TERRITORY:
+            territory = self.territory()
+            colors = np.array([GROUP_COLORS[colony] + (160,) for colony in COLONIES] + [(0, 0, 0, 0)],
+                              dtype=np.uint8)
+            rgba = colors[territory]  # Индекс -1 берет последний, прозрачный цвет
+        else:
+            counts = np.stack([grids[group] for group in GROUP_COLORS]).astype(float)
+            total = counts.sum(axis=0)
+            shares = counts / np.maximum(total, 1)
+            colors = np.array(list(GROUP_COLORS.values()), dtype=float)
+            rgb = np.tensordot(shares, colors, axes=(0, 0))
+            # Прозрачность растет с плотностью; корень выделяет редкие клетки
+            alpha = np.sqrt(total / max(total.max(), 1)) * 230
+            rgba = np.concatenate((rgb, alpha[..., None]), axis=-1).round().astype(np.uint8)
+        # Сетки индексируются [x, y], строки изображения - по y
+        return np.ascontiguousarray(rgba.transpose(1, 0, 2))
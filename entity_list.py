@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class EntityList(list):
+    """Список сущностей с удалением мертвых без перестройки всего списка
+
+    Освободившиеся после смерти ячейки занимают новорожденные, а лишние
+    ячейки убираются перестановкой последнего элемента на место удаленного.
+    Стоимость обновления - O(смертей + рождений), а не O(популяции).
+    Порядок элементов при этом не сохраняется.
+
+    Список также служит группой для NeighborCache: version растет при
+    каждом изменении состава или позиций, а столбцы атрибутов (позиции,
+    радиусы и т.п.) кэшируются до следующего изменения.
+    """
+
+    __slots__ = ('version', '_columns')
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.version = 0
+        self._columns = {}
+
+    def __getstate__(self):
+        # Кэш столбцов не сохраняется: он восстанавливается по требованию
+        # и лишь увеличил бы ключевые кадры и контрольные точки
+        return self.version
+
+    def __setstate__(self, state):
+        self.version = state
+        self._columns = {}
+
+    def touch(self):
+        """Отметка об изменении позиций или состава списка"""
+        self.version += 1
+        self._columns = {}
+
+    def column(self, name):
+        """Массив значений атрибута name всех сущностей (в порядке списка)"""
+        values = self._columns.get(name)
+        if values is None:
+            values = np.array([getattr(entity, name) for entity in self], dtype=float)
+            self._columns[name] = values
+        return values
+
+    def positions(self):
+        """Массив позиций всех сущностей формы (n, 2)"""
+        return self.column('position').reshape(-1, 2)
+
+    def mask(self, predicate):
+        """Булева маска сущностей, удовлетворяющих predicate"""
+        return np.fromiter((predicate(entity) for entity in self), dtype=bool, count=len(self))
+
+    def compact(self, dead_indices, newborns=()):
+        """Удаление сущностей с индексами dead_indices и вставка новорожденных"""
+        newborns = list(newborns)
+        dead_indices = sorted(dead_indices)
+
+        # Новорожденные занимают ячейки умерших
+        reused = min(len(dead_indices), len(newborns))
+        for i in range(reused):
+            self[dead_indices[i]] = newborns[i]
+
+        # Оставшиеся ячейки закрываем последними элементами, начиная с конца,
+        # чтобы перенос не задевал еще не обработанные индексы
+        for index in reversed(dead_indices[reused:]):
+            last = self.pop()
+            if index < len(self):
+                self[index] = last
+
+        # Новорожденных больше, чем освободившихся ячеек
+        self.extend(newborns[reused:])
+        self.touch()
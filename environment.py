@@ -1,12 +1,57 @@
 import numpy as np
 import random
 
+from recorder import FOOD
+
+# Сторона квадратного фрагмента карты еды, по которым отслеживаются изменения
+FOOD_TILE = 16
+# Выборка клеток по индексам в 15-20 раз дороже сплошного копирования или
+# сравнения, а карта меньше FULL_REFRESH_CELLS клеток целиком лежит в кэше.
+# Поэтому изменившиеся фрагменты обрабатываются отдельно, только пока их
+# доля не больше FULL_REFRESH_FRACTION, иначе - вся карта
+FULL_REFRESH_FRACTION = 0.05
+FULL_REFRESH_CELLS = 1 << 17
+
+
+def prefer_full_map(dirty, width, height):
+    """Дешевле ли обработать всю карту, чем фрагменты, отмеченные в dirty"""
+    return width * height < FULL_REFRESH_CELLS or dirty.mean() > FULL_REFRESH_FRACTION
+
+
+def tile_cells(dirty, tile, width, height):
+    """Плоские индексы (x * height + y) клеток во фрагментах, отмеченных в dirty
+
+    dirty - логическая сетка фрагментов (столбцы, строки); клетки
+    последних фрагментов за краем среды отбрасываются.
+    """
+    tiles = np.argwhere(dirty)
+    if not len(tiles):
+        return np.zeros(0, dtype=np.int64)
+    span = np.arange(tile)
+    x = tiles[:, 0, None, None] * tile + span[None, :, None]
+    y = tiles[:, 1, None, None] * tile + span[None, None, :]
+    cells = x * height + y
+    if width % tile or height % tile:
+        return cells[(x < width) & (y < height)]
+    return cells.ravel()
+
+
 class Environment:
     """Класс для представления среды симуляции"""
-    def __init__(self, width, height, initial_food=500):
+    def __init__(self, width, height, initial_food=500, lattice=False):
         self.width = width
         self.height = height
+        # Решеточный режим: позиции сущностей - целые клетки, соседи ищутся по сеткам занятости
+        self.lattice = lattice
         self.food_map = np.zeros((width, height))
+        # Отслеживание изменений еды: каждая запись увеличивает food_version и
+        # отмечает им свой фрагмент FOOD_TILE x FOOD_TILE в tile_versions.
+        # Потребители (отрисовка, экспорт) помнят последнюю увиденную версию
+        # и забирают только фрагменты новее нее, не мешая друг другу
+        self.tile = FOOD_TILE
+        self.food_version = 0
+        self.tile_versions = np.zeros((-(-width // self.tile), -(-height // self.tile)), dtype=np.int64)
+        self.recorder = None  # Журнал событий; Simulation подключает свой
         self.spawn_food(initial_food)
     
     def spawn_food(self, amount):
@@ -15,7 +60,7 @@ class Environment:
         for _ in range(amount):
             x = random.randint(0, self.width - 1)
             y = random.randint(0, self.height - 1)
-            self.food_map[x, y] += random.randint(5, 20)
+            self._add_food(x, y, random.randint(5, 20))
         
         # Создание нескольких "островков" еды с высокой концентрацией
         food_clusters = random.randint(3, 6)
@@ -34,8 +79,41 @@ class Environment:
                 
                 # Проверка границ
                 if 0 <= x < self.width and 0 <= y < self.height:
-                    self.food_map[x, y] += random.randint(10, 30)
+                    self._add_food(x, y, random.randint(10, 30))
+    
+    def _add_food(self, x, y, amount):
+        """Добавление еды в клетку с записью в журнал событий"""
+        self.food_map[x, y] += amount
+        self._touch(x, y)
+        if self.recorder:
+            self.recorder.log(FOOD, -1, x, y, amount=amount)
     
+    def _touch(self, x, y):
+        """Отметка изменения клетки (x, y) в версии ее фрагмента"""
+        self.food_version += 1
+        self.tile_versions[x // self.tile, y // self.tile] = self.food_version
+
+    def dirty_tiles(self, since):
+        """Логическая сетка фрагментов, изменившихся после версии since"""
+        return self.tile_versions > since
+
+    def tile_bounds(self, tx, ty):
+        """Границы клеток фрагмента (tx, ty): x0, x1, y0, y1"""
+        x0, y0 = tx * self.tile, ty * self.tile
+        return x0, min(x0 + self.tile, self.width), y0, min(y0 + self.tile, self.height)
+
+    def dirty_cells(self, since):
+        """Плоские индексы клеток фрагментов, изменившихся после версии since
+
+        None, если изменилась большая часть карты и дешевле обработать ее целиком.
+        """
+        if since >= self.food_version:
+            return np.zeros(0, dtype=np.int64)
+        dirty = self.dirty_tiles(since)
+        if prefer_full_map(dirty, self.width, self.height):
+            return None
+        return tile_cells(dirty, self.tile, self.width, self.height)
+
     def has_food(self, position):
         """Проверка наличия еды в данном месте"""
         x, y = int(position[0]), int(position[1])
@@ -49,6 +127,7 @@ class Environment:
         if 0 <= x < self.width and 0 <= y < self.height and self.food_map[x, y] > 0:
             amount = min(10, self.food_map[x, y])
             self.food_map[x, y] -= amount
+            self._touch(x, y)
             return amount
         return 0
     
@@ -73,4 +152,4 @@ class Environment:
                 y = int(center_y + radius * np.sin(angle))
                 
                 if 0 <= x < self.width and 0 <= y < self.height:
-                    self.food_map[x, y] += random.randint(10, 30)
\ No newline at end of file
+                    self._add_food(x, y, random.randint(10, 30))
\ No newline at end of file
@@ -0,0 +1,138 @@
+import numpy as np
+
+from spatial import NeighborCache, _empty_pairs
+
+# Чтение клеток по смещениям выгоднее сравнения расстояний по корзинам,
+# пока смещений в радиусе немного: при 5000 муравьях на 200x200 граница
+# около радиуса 3 (29 смещений), при радиусе 15 (709 смещений) клетки
+# в 3-5 раз медленнее корзин
+MAX_LATTICE_PROBES = 32
+
+
+def lattice_offsets(radius):
+    """Целочисленные смещения (dx, dy) клеток на расстоянии не больше radius"""
+    reach = int(np.floor(radius))
+    span = np.arange(-reach, reach + 1)
+    dx, dy = np.meshgrid(span, span, indexing='ij')
+    inside = dx ** 2 + dy ** 2 <= radius * radius
+    return dx[inside], dy[inside]
+
+
+def snap(positions, width, height):
+    """Позиции, округленные до клеток решетки внутри среды"""
+    cells = np.rint(positions)
+    cells[:, 0] = np.clip(cells[:, 0], 0, width - 1)
+    cells[:, 1] = np.clip(cells[:, 1], 0, height - 1)
+    return cells
+
+
+class OccupancyGrid:
+    """Занятость клеток решетки одной группой сущностей
+
+    Клетки сущностей хранятся в массиве int32, число сущностей в каждой
+    клетке - в сетке counts (width, height), а индексы сущностей
+    отсортированы по клетке, так что starts[клетка] - голова ее списка.
+    Сетка пересчитывается одним bincount, только когда меняется version
+    группы, то есть после движения или смены состава.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.group = None
+        self.version = None
+        self.cells = np.zeros((0, 2), dtype=np.int32)
+        self.counts = np.zeros((width, height), dtype=np.int32)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(width * height + 1, dtype=np.int64)
+
+    def update(self, group):
+        """Пересчет занятости, если группа или ее version изменились"""
+        if group is self.group and group.version == self.version:
+            return self
+        self.group = group
+        self.version = group.version
+        positions = np.asarray(group.positions(), dtype=float).reshape(-1, 2)
+        self.cells = snap(positions, self.width, self.height).astype(np.int32)
+        keys = self.cells[:, 0].astype(np.int64) * self.height + self.cells[:, 1]
+        flat = np.bincount(keys, minlength=self.width * self.height)
+        self.counts = flat.reshape(self.width, self.height).astype(np.int32)
+        self.order = np.argsort(keys, kind='stable')
+        self.starts = np.concatenate(([0], np.cumsum(flat)))
+        return self
+
+    def pairs(self, other, radius, chunk_cells=2_000_000):
+        """Пары (i из self, j из other, квадрат расстояния) на решетке в радиусе radius
+
+        Для каждой сущности и каждого смещения из lattice_offsets
+        диапазон соседей читается из starts напрямую, без поиска. Клетки
+        всех смещений обрабатываются одной операцией над массивом
+        (сущности x смещения), по частям не больше chunk_cells клеток.
+        """
+        if not len(self.cells) or not len(other.cells) or radius < 0:
+            return _empty_pairs()
+        dx, dy = lattice_offsets(radius)
+        distance = (dx * dx + dy * dy).astype(float)
+        step = max(1, chunk_cells // len(dx))
+        found = []
+        for start in range(0, len(self.cells), step):
+            cells = self.cells[start:start + step].astype(np.int64)
+            nx = cells[:, 0, None] + dx
+            ny = cells[:, 1, None] + dy
+            inside = (nx >= 0) & (nx < other.width) & (ny >= 0) & (ny < other.height)
+            rows, columns = np.nonzero(inside)
+            keys = nx[rows, columns] * other.height + ny[rows, columns]
+            low = other.starts[keys]
+            counts = other.starts[keys + 1] - low
+            total = counts.sum()
+            if not total:
+                continue
+            # Разворачиваем диапазоны [low, low + count) в плоский список индексов
+            offsets = np.repeat(low - (np.cumsum(counts) - counts), counts)
+            found.append((np.repeat(rows + start, counts), other.order[np.arange(total) + offsets],
+                          np.repeat(distance[columns], counts)))
+        if not found:
+            return _empty_pairs()
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+class LatticeNeighborCache(NeighborCache):
+    """NeighborCache для решеточного режима: пары из сеток занятости
+
+    Группы раскладываются по OccupancyGrid (одна сетка на группу,
+    пересчет по version), а соседи в малом радиусе находятся чтением
+    клеток по целочисленным смещениям вместо сравнения расстояний. Для
+    радиусов больше MAX_LATTICE_PROBES смещений пары ищутся, как в
+    непрерывном режиме: позиции на решетке целые, так что пары те же.
+    """
+
+    def __init__(self, width, height, executor=None, chunk_size=50_000):
+        super().__init__(executor, chunk_size)
+        self.width = width
+        self.height = height
+        self.grids = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['grids'] = {}
+        return state
+
+    def grid(self, group):
+        """Сетка занятости группы"""
+        entry = self.grids.get(id(group))
+        if entry is None or entry.group is not group:
+            entry = self.grids[id(group)] = OccupancyGrid(self.width, self.height)
+        return entry.update(group)
+
+    def _compute(self, group_a, group_b, radius):
+        if len(lattice_offsets(radius)[0]) > MAX_LATTICE_PROBES:
+            return super()._compute(group_a, group_b, radius)
+        index_a, index_b, distance_sq = self.grid(group_a).pairs(self.grid(group_b), radius)
+        if group_a is group_b:
+            distinct = index_a != index_b
+            index_a, index_b, distance_sq = index_a[distinct], index_b[distinct], distance_sq[distinct]
+        pairs = (index_a, index_b, distance_sq)
+        self.entries[(id(group_a), id(group_b))] = ((group_a, group_b), (group_a.version, group_b.version),
+                                                    radius, pairs)
+        self.computed += 1
+        return pairs
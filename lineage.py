@@ -0,0 +1,171 @@
+import numpy as np
+
+
+class LineageStore:
+    """Родословная: записи о рождениях в растущих целочисленных массивах
+
+    Каждая запись (строка) - одна особь: ее ID в группе, строки
+    родителей (-1 у основателей), день рождения, номер группы
+    (Recorder.group_of) и основатель материнской линии. Родители всегда
+    записаны раньше потомков, поэтому обходы поколений выполняются
+    операциями над массивами без ссылок между объектами. Строка занимает
+    21 байт, плюс 4 байта на ID в таблице поиска.
+    """
+
+    FIELDS = (('ids', np.int32), ('parent_a', np.int32), ('parent_b', np.int32),
+              ('birth_day', np.int32), ('group', np.int8), ('founder', np.int32))
+
+    def __init__(self, capacity=1024):
+        self.count = 0
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.row_of = {}  # группа -> массив строк по ID особи (-1 - нет записи)
+        self.day = 0      # День, которым помечаются рождения
+
+    def _reserve(self, capacity):
+        """Увеличение емкости массивов не менее чем до capacity"""
+        if capacity <= len(self.ids):
+            return
+        capacity = max(capacity, 2 * len(self.ids))
+        for name, dtype in self.FIELDS:
+            new = np.zeros(capacity, dtype=dtype)
+            new[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, new)
+
+    def _lookup_table(self, group, size):
+        table = self.row_of.get(group, np.zeros(0, dtype=np.int32))
+        if size > len(table):
+            grown = np.full(max(size, 2 * len(table)), -1, dtype=np.int32)
+            grown[:len(table)] = table
+            table = self.row_of[group] = grown
+        return table
+
+    def rows(self, group, ids):
+        """Строки особей группы по их ID (-1 для незаписанных)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        table = self.row_of.get(group, np.zeros(0, dtype=np.int32))
+        result = np.full(len(ids), -1, dtype=np.int32)
+        known = ids < len(table)
+        result[known] = table[ids[known]]
+        return result
+
+    def begin_day(self, day):
+        self.day = day
+
+    def record(self, group, ids, parent_a=None, parent_b=None):
+        """Запись рождений; без родителей особи считаются основателями
+
+        Уже записанные ID пропускаются, поэтому повторный проход дней
+        после перемотки симуляции не дублирует записи.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        table = self._lookup_table(group, int(ids.max()) + 1)
+        new = table[ids] < 0
+        ids = ids[new]
+        born = len(ids)
+        if not born:
+            return
+        parents = []
+        for parent_ids in (parent_a, parent_b):
+            if parent_ids is None:
+                parents.append(np.full(born, -1, dtype=np.int32))
+            else:
+                parents.append(self.rows(group, np.asarray(parent_ids)[new]))
+
+        start, end = self.count, self.count + born
+        self._reserve(end)
+        rows = np.arange(start, end, dtype=np.int32)
+        self.ids[start:end] = ids
+        self.parent_a[start:end] = parents[0]
+        self.parent_b[start:end] = parents[1]
+        self.birth_day[start:end] = self.day
+        self.group[start:end] = group
+        # Материнская линия: основатель матери, иначе единственного родителя, иначе сама особь
+        line_parent = np.where(parents[1] >= 0, parents[1], parents[0])
+        self.founder[start:end] = np.where(line_parent >= 0, self.founder[np.maximum(line_parent, 0)], rows)
+        table[ids] = rows
+        self.count = end
+
+    def _parents(self):
+        return self.parent_a[:self.count], self.parent_b[:self.count]
+
+    def ancestors(self, row, generations=None):
+        """Строки всех предков особи row (не более generations поколений)"""
+        parent_a, parent_b = self._parents()
+        found = np.zeros(self.count, dtype=bool)
+        frontier = np.array([row])
+        depth = 0
+        while len(frontier) and (generations is None or depth < generations):
+            parents = np.concatenate((parent_a[frontier], parent_b[frontier]))
+            parents = np.unique(parents[parents >= 0])
+            frontier = parents[~found[parents]]
+            found[frontier] = True
+            depth += 1
+        return np.flatnonzero(found)
+
+    def descendants(self, row, generations=None):
+        """Строки всех потомков особи row (не более generations поколений)"""
+        parent_a, parent_b = self._parents()
+        # Дополнительная ячейка в конце отвечает родителю -1
+        found = np.zeros(self.count + 1, dtype=bool)
+        found[row] = True
+        depth = 0
+        while generations is None or depth < generations:
+            reached = (found[parent_a] | found[parent_b]) & ~found[:self.count]
+            if not reached.any():
+                break
+            found[:self.count] |= reached
+            depth += 1
+        found[row] = False
+        return np.flatnonzero(found[:self.count])
+
+    def common_ancestor(self, row_a, row_b):
+        """Ближайший общий предок двух особей или -1
+
+        Предки обеих особей раскрываются по поколениям одновременно, и
+        поиск останавливается на первом пересечении, так что стоимость
+        зависит от глубины общего предка, а не от размера родословной.
+        Из нескольких общих предков одного поколения выбирается родившийся
+        позже. Сама особь считается своим предком.
+        """
+        parent_a, parent_b = self._parents()
+        seen = [np.zeros(self.count, dtype=bool), np.zeros(self.count, dtype=bool)]
+        frontiers = [np.array([row_a]), np.array([row_b])]
+        seen[0][row_a] = True
+        seen[1][row_b] = True
+        while True:
+            common = np.concatenate((frontiers[0][seen[1][frontiers[0]]], frontiers[1][seen[0][frontiers[1]]]))
+            if len(common):
+                return int(common.max())
+            if not len(frontiers[0]) and not len(frontiers[1]):
+                return -1
+            for side in (0, 1):
+                frontier = frontiers[side]
+                parents = np.concatenate((parent_a[frontier], parent_b[frontier]))
+                parents = np.unique(parents[parents >= 0])
+                frontiers[side] = parents[~seen[side][parents]]
+                seen[side][frontiers[side]] = True
+
+    def survival(self, group, living_ids):
+        """Число живых особей каждой материнской линии группы
+
+        Возвращает строки основателей и число их живых потомков (вместе
+        с ними самими), по убыванию численности.
+        """
+        rows = self.rows(group, living_ids)
+        rows = rows[rows >= 0]
+        founders, counts = np.unique(self.founder[rows], return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return founders[order], counts[order]
+
+    def describe(self, rows):
+        """Поля записей rows в виде словаря массивов"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return {name: getattr(self, name)[rows] for name, _ in self.FIELDS}
+
+    def nbytes(self):
+        """Память, занятая массивами родословной"""
+        return (sum(getattr(self, name).nbytes for name, _ in self.FIELDS) +
+                sum(table.nbytes for table in self.row_of.values()))
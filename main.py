@@ -1,81 +1,52 @@
+import argparse
 import time
-from environment import Environment
-from ant import RedAnt, BlackAnt
-from colony import Colony
-from simulation import Simulation
-from visualization import AntVisualization
-import matplotlib.pyplot as plt
-
-def run_with_visualization():
-    # Параметры симуляции
-    width, height = 100, 100
-    initial_red_ants = 30
-    initial_black_ants = 30
-    
-    # Создаем среду
-    environment = Environment(width, height, initial_food=800)
-    
-    # Создаем колонии муравьев
-    red_colony = Colony(RedAnt, initial_red_ants, environment)
-    black_colony = Colony(BlackAnt, initial_black_ants, environment)
-    
-    # Создаем симуляцию
-    simulation = Simulation(environment, red_colony, black_colony)
-    
+
+# Для расчета без визуализации нужны только модули модели;
+# matplotlib и визуализация импортируются лишь в визуальном режиме
+from scenario import DEFAULTS, build_simulation
+from termination import Convergence, Extinction, PopulationFloor
+
+
+def run_with_visualization(simulation, days):
+    from visualization import AntVisualization
+
     # Создаем и запускаем визуализацию
     print("Запуск визуализации симуляции муравьев...")
     viz = AntVisualization(simulation)
-    viz.animate(frames=500, interval=100)  # 500 дней, обновление каждые 100 мс
-
-def run_without_visualization():
-    # Параметры симуляции
-    width, height = 100, 100
-    initial_red_ants = 50
-    initial_black_ants = 50
-    days_to_simulate = 200
-    
-    # Создаем среду
-    environment = Environment(width, height, initial_food=1000)
-    
-    # Создаем колонии муравьев
-    red_colony = Colony(RedAnt, initial_red_ants, environment)
-    black_colony = Colony(BlackAnt, initial_black_ants, environment)
-    
-    # Создаем симуляцию
-    simulation = Simulation(environment, red_colony, black_colony)
-    
+    viz.animate(frames=days, interval=100)  # Обновление каждые 100 мс
+
+def run_without_visualization(simulation, days):
+    red_colony = simulation.red_colony
+    black_colony = simulation.black_colony
+
     # Запускаем симуляцию
-    print(f"Запуск симуляции на {days_to_simulate} дней...")
+    print(f"Запуск симуляции на {days} дней...")
     start_time = time.time()
-    
-    simulation.run(days_to_simulate)
-    
+
+    simulation.run(days)
+
     end_time = time.time()
-    print(f"Симуляция завершена за {end_time - start_time:.2f} секунд.")
-    
+    print(f"Симуляция завершена за {end_time - start_time:.2f} секунд "
+          f"на дне {simulation.day} (критерий: {simulation.stop_reason}).")
+
     # Вывод финальной статистики
     print("\nРезультаты симуляции:")
     print(f"Выжившие красные муравьи: {red_colony.count()}")
     print(f"Выжившие черные муравьи: {black_colony.count()}")
-    
+
     # Анализ эволюции параметров
     if red_colony.count() > 0:
         print("\nФинальные параметры красных муравьев:")
         red_stats = red_colony.get_average_stats()
         for key, value in red_stats.items():
             print(f"Средний {key}: {value:.2f}")
-            
+
     if black_colony.count() > 0:
         print("\nФинальные параметры черных муравьев:")
         black_stats = black_colony.get_average_stats()
         for key, value in black_stats.items():
             print(f"Средний {key}: {value:.2f}")
-    
-    # Визуализация результатов
-    simulation.visualize_population_history()
-    simulation.visualize_attributes_evolution()
-    simulation.visualize_current_state()
-    
+
     # Определение победителя
     if red_colony.count() > black_colony.count():
         print("\nПобедили красные муравьи!")
@@ -84,13 +55,56 @@ def run_without_visualization():
     else:
         print("\nНичья!")
 
-def main():
-    visualization_mode = input("Запустить с визуализацией в реальном времени? (y/n): ").lower().strip()
-    
-    if visualization_mode == 'y':
-        run_with_visualization()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция колоний муравьев")
+    parser.add_argument('--width', type=int, default=DEFAULTS['width'], help="Ширина среды")
+    parser.add_argument('--height', type=int, default=DEFAULTS['height'], help="Высота среды")
+    parser.add_argument('--food', type=int, default=DEFAULTS['food'], help="Начальное количество еды")
+    parser.add_argument('--red', type=int, default=DEFAULTS['red_ants'], help="Начальное число красных муравьев")
+    parser.add_argument('--black', type=int, default=DEFAULTS['black_ants'], help="Начальное число черных муравьев")
+    parser.add_argument('--peaceful', type=int, default=DEFAULTS['peaceful'], help="Число мирных существ")
+    parser.add_argument('--predators', type=int, default=DEFAULTS['predators'], help="Число хищников")
+    parser.add_argument('--days', type=int, default=200, help="Число дней симуляции")
+    parser.add_argument('--seed', type=int, help="Зерно генераторов случайных чисел")
+    parser.add_argument('--lattice', action='store_true', help="Решеточный режим: целые позиции и сетки занятости")
+    parser.add_argument('--visual', action='store_true', help="Визуализация в реальном времени (matplotlib)")
+    parser.add_argument('--snapshots', help="Файл для записи покадровых снимков (отрисовка: render.py)")
+    parser.add_argument('--stop-on-extinction', action='store_true', help="Остановка при вымирании колонии")
+    parser.add_argument('--min-population', type=int, help="Остановка, когда муравьев меньше заданного числа")
+    parser.add_argument('--converge-window', type=int,
+                        help="Остановка, когда численности не меняются дольше заданного числа дней")
+    parser.add_argument('--converge-tolerance', type=float, default=0.05,
+                        help="Допустимый относительный размах численности для --converge-window")
+    return parser.parse_args(argv)
+
+def termination_criteria(args):
+    """Критерии остановки из аргументов командной строки"""
+    criteria = []
+    if args.stop_on_extinction:
+        criteria.append(Extinction())
+    if args.min_population is not None:
+        criteria.append(PopulationFloor(args.min_population))
+    if args.converge_window:
+        criteria.append(Convergence(args.converge_window, args.converge_tolerance))
+    return criteria
+
+def main(argv=None):
+    args = parse_args(argv)
+    simulation = build_simulation(width=args.width, height=args.height, food=args.food,
+                                  red_ants=args.red, black_ants=args.black,
+                                  peaceful=args.peaceful, predators=args.predators, seed=args.seed,
+                                  lattice=args.lattice)
+    simulation.criteria = termination_criteria(args)
+    if args.snapshots:
+        from render import SnapshotRecorder
+        snapshots = SnapshotRecorder(simulation)
+
+    if args.visual:
+        run_with_visualization(simulation, args.days)
     else:
-        run_without_visualization()
+        run_without_visualization(simulation, args.days)
+    if args.snapshots:
+        snapshots.save(args.snapshots)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,137 @@
+import sys
+import tracemalloc
+import types
+from concurrent.futures import Executor
+
+import numpy as np
+
+# Объекты, которые не относятся к данным симуляции и не обходятся
+_SKIPPED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, Executor)
+
+
+def deep_size(obj, seen, stop=frozenset()):
+    """Байты obj и всех достижимых из него объектов, кроме уже учтенных в seen
+
+    seen - множество id учтенных объектов; оно пополняется, так что при
+    последовательных вызовах общий объект засчитывается первому. Объекты
+    с id из stop (корни других подсистем) не обходятся.
+    """
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SKIPPED) or (id(item) in stop and item is not obj):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, np.ndarray):
+            if item.dtype == object:
+                stack.extend(item.ravel().tolist())
+        elif isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, bytearray, int, float, bool)):
+            attributes = getattr(item, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(item).__mro__:
+                for name in cls.__dict__.get('__slots__', ()):
+                    if hasattr(item, name):
+                        stack.append(getattr(item, name))
+    return total
+
+
+def memory_report(simulation, extra=None):
+    """Байты по классам сущностей и подсистемам симуляции
+
+    Сначала учитываются сами сущности (муравьи со своими атрибутами,
+    хранилища существ), затем подсистемы без уже учтенных сущностей:
+    журнал, родословная, таймеры, кэш соседей, среда, контейнеры колоний,
+    менеджер существ и истории. extra - словарь дополнительных объектов
+    (например, буферов графиков интерфейса), учитываемых под своими именами.
+    """
+    seen = set()
+    report = {}
+    for colony in (simulation.red_colony, simulation.black_colony):
+        name = colony.ant_type.__name__
+        report[name] = report.get(name, 0) + sum(deep_size(ant, seen) for ant in colony.ants)
+    creature_manager = simulation.creature_manager
+    if creature_manager:
+        for store in (creature_manager.peaceful_creatures, creature_manager.predators):
+            report[store.species.__name__] = deep_size(store, seen)
+
+    subsystems = {
+        'recorder': [simulation.recorder],
+        'lineage': [simulation.lineage],
+        'timers': [simulation.timers],
+        'neighbors': [simulation.neighbors],
+        'environment': [simulation.environment],
+        'colonies': [simulation.red_colony, simulation.black_colony],
+        'creature_manager': [creature_manager],
+        'history': [value for name, value in vars(simulation).items() if name.endswith('_history')],
+    }
+    for name, obj in (extra or {}).items():
+        subsystems[name] = [obj]
+    # Ссылки на другие подсистемы (например, владельцы событий таймеров) не обходятся
+    roots = {id(simulation)} | {id(obj) for objects in subsystems.values() for obj in objects}
+    for name, objects in subsystems.items():
+        objects = [obj for obj in objects if obj is not None]
+        if objects:
+            report[name] = sum(deep_size(obj, seen, roots) for obj in objects)
+    report['total'] = sum(report.values())
+    return report
+
+
+class MemoryMonitor:
+    """Периодический учет памяти симуляции и снимки tracemalloc
+
+    Каждые interval дней пересчитывается memory_report; последний отчет
+    попадает в статистику дня (ключ 'memory') и в memory_history
+    симуляции. Если задан snapshot_interval, каждые snapshot_interval
+    дней снимается tracemalloc-снимок и сравнивается с предыдущим;
+    top строк с наибольшим ростом сохраняются в diffs.
+    """
+
+    def __init__(self, simulation, interval=100, snapshot_interval=None, top=10, extra=None):
+        self.simulation = simulation
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.extra = extra  # Дополнительные объекты для учета, например буферы PopulationGraph
+        self.metrics = None
+        self.snapshot = None
+        self.diffs = []  # (день, [(место, прирост байт, прирост числа блоков)])
+        if snapshot_interval and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        simulation.memory_monitor = self
+        self.on_day()
+
+    def on_day(self):
+        """Вызывается симуляцией в конце каждого дня"""
+        day = self.simulation.day
+        if self.metrics is None or day % self.interval == 0:
+            self.metrics = {'day': day, **memory_report(self.simulation, self.extra)}
+            if tracemalloc.is_tracing():
+                self.metrics['traced'], self.metrics['traced_peak'] = tracemalloc.get_traced_memory()
+        if self.snapshot_interval and day % self.snapshot_interval == 0:
+            self.take_snapshot()
+
+    def take_snapshot(self):
+        """Снимок tracemalloc и разница с предыдущим снимком"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        if self.snapshot is not None:
+            growth = snapshot.compare_to(self.snapshot, 'lineno')[:self.top]
+            self.diffs.append((self.simulation.day, [
+                (str(stat.traceback), stat.size_diff, stat.count_diff) for stat in growth
+            ]))
+        self.snapshot = snapshot
+
+    def stop(self):
+        """Отключение от симуляции и остановка tracemalloc"""
+        self.simulation.memory_monitor = None
+        if self.snapshot_interval and tracemalloc.is_tracing():
+            tracemalloc.stop()
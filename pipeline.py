@@ -0,0 +1,162 @@
+import time
+
+# Общие ресурсы состояния, которые объявляют фазы тика
+RNG = 'rng'  # Глобальные генераторы random и np.random: порядок выборок определяет траекторию
+DAY = 'day'
+TIMERS = 'timers'
+FOOD = 'food'
+RED_ANTS = 'red_ants'
+BLACK_ANTS = 'black_ants'
+CREATURES = 'creatures'
+NEIGHBORS = 'neighbors'
+RECORDER = 'recorder'  # Журнал событий и родословная: порядок записей важен
+HISTORY = 'history'
+MEMORY = 'memory'
+KEYFRAMES = 'keyframes'
+EXPORT = 'export'
+SNAPSHOTS = 'snapshots'
+# Лениво заполняемые кэши производных данных: столбцы EntityList и снимок
+# статистики дня. Их пишут и фазы, которые только читают модель
+CACHES = 'caches'
+
+# Все состояние симуляции, которое читают наблюдатели конца дня
+WORLD = frozenset((DAY, TIMERS, FOOD, RED_ANTS, BLACK_ANTS, CREATURES, HISTORY))
+
+
+class Phase:
+    """Фаза тика: функция от симуляции и объявленные ресурсы
+
+    reads и writes - множества имен ресурсов. Две фазы независимы, если
+    ни одна не пишет то, что другая читает или пишет; независимые фазы,
+    стоящие подряд, могут выполняться одновременно.
+    """
+
+    def __init__(self, name, run, reads=(), writes=(), enabled=True):
+        self.name = name
+        self.run = run
+        self.reads = frozenset(reads)
+        self.writes = frozenset(writes)
+        self.enabled = enabled
+
+    def conflicts(self, other):
+        """Зависят ли фазы друг от друга через общие ресурсы"""
+        return bool(self.writes & (other.reads | other.writes) or other.writes & self.reads)
+
+    def __repr__(self):
+        return f"Phase({self.name!r})"
+
+
+class TickPipeline:
+    """Упорядоченный список фаз тика с группировкой независимых фаз
+
+    Фазы можно добавлять, переставлять, отключать и заменять по имени.
+    Перед выполнением подряд идущие фазы без конфликтов ресурсов
+    объединяются в этапы; этапы выполняются по порядку, а фазы одного
+    этапа с executor - одновременно. Фазы меняют симуляцию на месте,
+    поэтому подходит только пул потоков: выигрыш дают фазы, чьи ядра
+    NumPy отпускают GIL. Время каждой фазы накапливается в timings.
+    """
+
+    def __init__(self, phases=(), executor=None):
+        if executor is not None:
+            # Импорт только при переданном пуле: без него счет обходится без multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            if isinstance(executor, ProcessPoolExecutor):
+                raise ValueError("Фазы меняют состояние симуляции на месте; нужен пул потоков")
+        self.phases = list(phases)
+        self.executor = executor
+        self.timings = {}  # имя фазы -> [суммарное время, число вызовов]
+        self._stages = None
+
+    def __getstate__(self):
+        """При сохранении состояния пул и накопленные времена не сохраняются"""
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['timings'] = {}
+        state['_stages'] = None
+        return state
+
+    def _index(self, name):
+        for index, phase in enumerate(self.phases):
+            if phase.name == name:
+                return index
+        raise KeyError(f"Нет фазы {name!r}")
+
+    def __getitem__(self, name):
+        return self.phases[self._index(name)]
+
+    def names(self):
+        return [phase.name for phase in self.phases]
+
+    def add(self, phase, before=None, after=None):
+        """Добавление фазы в конец, перед фазой before или после фазы after"""
+        if phase.name in self.names():
+            raise ValueError(f"Фаза {phase.name!r} уже есть")
+        if before is not None:
+            self.phases.insert(self._index(before), phase)
+        elif after is not None:
+            self.phases.insert(self._index(after) + 1, phase)
+        else:
+            self.phases.append(phase)
+        self._stages = None
+
+    def remove(self, name):
+        phase = self.phases.pop(self._index(name))
+        self._stages = None
+        return phase
+
+    def replace(self, phase):
+        """Замена фазы с тем же именем"""
+        self.phases[self._index(phase.name)] = phase
+        self._stages = None
+
+    def move(self, name, before=None, after=None):
+        """Перестановка фазы name перед before или после after"""
+        self.add(self.remove(name), before, after)
+
+    def reorder(self, names):
+        """Новый порядок фаз; фазы, не названные в names, идут следом в прежнем порядке"""
+        order = {name: index for index, name in enumerate(names)}
+        self.phases.sort(key=lambda phase: order.get(phase.name, len(order)))
+        self._stages = None
+
+    def set_enabled(self, name, enabled=True):
+        self[name].enabled = enabled
+        self._stages = None
+
+    def stages(self):
+        """Этапы: списки подряд идущих включенных фаз без взаимных конфликтов"""
+        if self._stages is None:
+            stages = []
+            for phase in self.phases:
+                if not phase.enabled:
+                    continue
+                if stages and not any(phase.conflicts(other) for other in stages[-1]):
+                    stages[-1].append(phase)
+                else:
+                    stages.append([phase])
+            self._stages = stages
+        return self._stages
+
+    def _timed(self, phase, simulation):
+        start = time.perf_counter()
+        phase.run(simulation)
+        timing = self.timings.setdefault(phase.name, [0.0, 0])
+        timing[0] += time.perf_counter() - start
+        timing[1] += 1
+
+    def run(self, simulation):
+        """Выполнение одного тика"""
+        for stage in self.stages():
+            if self.executor is None or len(stage) == 1:
+                for phase in stage:
+                    self._timed(phase, simulation)
+            else:
+                futures = [self.executor.submit(self._timed, phase, simulation) for phase in stage]
+                for future in futures:
+                    future.result()
+
+    def profile(self):
+        """Фазы по убыванию суммарного времени: (имя, секунды, вызовы)"""
+        return sorted(((name, total, calls) for name, (total, calls) in self.timings.items()),
+                      key=lambda item: -item[1])
@@ -0,0 +1,115 @@
+import io
+import pickle
+import random
+import zlib
+from array import array
+
+import numpy as np
+
+# Виды событий журнала
+BIRTH, DEATH, ATTACK, FOOD = range(4)
+EVENT_KINDS = ('birth', 'death', 'attack', 'food')
+
+# Группы сущностей: номер группы - индекс имени класса
+GROUPS = ('RedAnt', 'BlackAnt', 'PeacefulCreature', 'Predator')
+
+# Причины смерти
+COMBAT, PREDATOR, STARVATION, AGING, HUNTED = range(5)
+DEATH_CAUSES = ('combat', 'predator', 'starvation', 'aging', 'hunted')
+
+
+class Recorder:
+    """Журнал событий симуляции с периодическими ключевыми кадрами
+
+    События хранятся построчно в столбцах array, только дописываясь в
+    конец. Значение полей строки зависит от вида события:
+
+    - birth: subject - потомок, other и extra - родители (-1, если
+      родитель один; оба -1 у основателей из Colony.spawn);
+    - death: subject - погибший, extra - причина из DEATH_CAUSES;
+    - attack: group/subject - атакующий, extra/other - группа и ID цели,
+      amount - урон;
+    - food: subject, other - клетка, amount - добавленная еда.
+
+    Ключевой кадр - сжатое полное состояние симуляции, включая состояние
+    генераторов случайных чисел, поэтому от него можно точно
+    пересчитать любой последующий день.
+    """
+
+    FIELDS = (('day', 'i'), ('kind', 'b'), ('group', 'b'), ('subject', 'q'), ('other', 'q'),
+              ('extra', 'q'), ('amount', 'd'))
+
+    def __init__(self, keyframe_interval=100):
+        self.keyframe_interval = keyframe_interval
+        self.columns = {name: array(typecode) for name, typecode in self.FIELDS}
+        self.keyframes = {}  # день -> сжатое состояние
+        self.day = 0          # День, к которому относятся записываемые события
+        self.last_day = 0     # Последний день, события которого записаны
+        self.active = True    # False при повторном проходе уже записанных дней
+
+    def count(self):
+        """Число записанных событий"""
+        return len(self.columns['day'])
+
+    @staticmethod
+    def group_of(entity_type):
+        """Номер группы для класса сущности"""
+        return GROUPS.index(entity_type.__name__)
+
+    def begin_day(self, day):
+        """Начало записи событий дня; уже записанные дни не дублируются"""
+        self.day = day
+        self.active = day > self.last_day
+        if self.active:
+            self.last_day = day
+
+    def log(self, kind, group, subject, other=-1, extra=-1, amount=0.0):
+        """Запись событий; subject и остальные поля могут быть массивами"""
+        if not self.active:
+            return
+        subject = np.atleast_1d(np.asarray(subject, dtype=np.int64))
+        if not len(subject):
+            return
+        values = (self.day, kind, group, subject, other, extra, amount)
+        for (name, typecode), value in zip(self.FIELDS, values):
+            column = np.broadcast_to(np.asarray(value, dtype=typecode), subject.shape)
+            self.columns[name].frombytes(np.ascontiguousarray(column).tobytes())
+
+    def events(self, kind=None, start=0, end=None):
+        """События дней [start, end) в виде словаря массивов NumPy"""
+        days = np.frombuffer(self.columns['day'], dtype=np.int32)
+        first = np.searchsorted(days, start, 'left')
+        last = len(days) if end is None else np.searchsorted(days, end, 'left')
+        result = {name: np.frombuffer(self.columns[name], dtype=typecode)[first:last].copy()
+                  for name, typecode in self.FIELDS}
+        if kind is not None:
+            selected = result['kind'] == kind
+            result = {name: values[selected] for name, values in result.items()}
+        return result
+
+    def wants_keyframe(self, day):
+        """Нужен ли ключевой кадр для дня day"""
+        return day % self.keyframe_interval == 0 and day not in self.keyframes
+
+    def save_keyframe(self, simulation):
+        """Сохранение полного состояния симуляции на текущий день"""
+        state = (simulation.environment, simulation.red_colony, simulation.black_colony,
+                 simulation.creature_manager, simulation.timers, random.getstate(), np.random.get_state())
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        # Журнал и родословная в кадр не попадают; после загрузки
+        # Simulation подключает их заново
+        detached = {id(obj) for obj in (self, getattr(simulation, 'lineage', None)) if obj is not None}
+        pickler.persistent_id = lambda obj: 'detached' if id(obj) in detached else None
+        pickler.dump(state)
+        self.keyframes[simulation.day] = zlib.compress(buffer.getvalue())
+
+    def nearest_keyframe(self, day):
+        """Ближайший день с ключевым кадром не позже day или None"""
+        return max((keyframe for keyframe in self.keyframes if keyframe <= day), default=None)
+
+    def load_keyframe(self, day):
+        """Состояние из ключевого кадра дня day в формате save_keyframe"""
+        unpickler = pickle.Unpickler(io.BytesIO(zlib.decompress(self.keyframes[day])))
+        unpickler.persistent_load = lambda pid: None
+        return unpickler.load()
@@ -0,0 +1,245 @@
+import argparse
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from service import FRAME_GROUPS, _view, decode_frame, encode_frame
+
+# Палитра кадров: уровни еды от белого к forestgreen (как в AntVisualization),
+# затем цвета групп сущностей в порядке FRAME_GROUPS
+FOOD_LEVELS = 100
+FOOD_MAX = 20.0  # Количество еды, которому соответствует самый темный уровень
+GROUP_COLORS = {
+    'red': (255, 0, 0),
+    'black': (0, 0, 0),
+    'peaceful': (0, 0, 255),
+    'predators': (150, 0, 150),
+}
+PALETTE = np.vstack((
+    np.linspace((255, 255, 255), (34, 139, 34), FOOD_LEVELS),
+    [GROUP_COLORS[group] for group in FRAME_GROUPS],
+)).round().astype(np.uint8)
+GROUP_INDEX = {group: FOOD_LEVELS + index for index, group in enumerate(FRAME_GROUPS)}
+
+# Порядок отрисовки: муравьи поверх существ
+DRAW_ORDER = ('peaceful', 'predators', 'red', 'black')
+
+# Файл снимков: сигнатура, размеры среды, затем кадры с длиной перед каждым
+FILE_HEADER = struct.Struct('<4sII')
+FILE_MAGIC = b'ANTS'
+FRAME_LENGTH = struct.Struct('<I')
+
+ANIMATED_FORMATS = ('.gif', '.webp', '.apng')
+
+
+def _image_module():
+    """Модуль PIL.Image; Pillow нужен только для записи файлов"""
+    try:
+        from PIL import Image
+    except ImportError as error:
+        raise ImportError("Для записи кадров нужен Pillow (pip install Pillow)") from error
+    return Image
+
+
+class SnapshotRecorder:
+    """Запись покадровых снимков симуляции для отрисовки без интерфейса
+
+    Снимок - двоичный кадр в формате service.encode_frame: позиции всех
+    групп и изменившиеся клетки еды относительно предыдущего снимка, так
+    что длинный прогон занимает немного памяти. Снимается каждый every-й
+    день; после перемотки симуляции уже записанные дни не повторяются.
+    """
+
+    def __init__(self, simulation, every=1):
+        self.simulation = simulation
+        self.every = every
+        self.width = simulation.environment.width
+        self.height = simulation.environment.height
+        self.frames = []
+        self.last_day = -1
+        self.food = None  # Карта еды последнего снимка
+        self.food_source = None  # Среда и версия еды последнего снимка
+        simulation.snapshot_recorder = self
+        self.capture()
+
+    def capture(self):
+        """Снимок текущего дня; вызывается симуляцией в конце дня"""
+        day = self.simulation.day
+        if day <= self.last_day or day % self.every:
+            return
+        environment = self.simulation.environment
+        view = _view(self.simulation)
+        # После перемотки среда - другой объект со своими версиями; тогда карта сравнивается целиком
+        since = self.food_source[1] if self.food_source and self.food_source[0] is environment else None
+        self.frames.append(encode_frame(0, view, self.food, since))
+        self.food = view['food']
+        self.food_source = (environment, view['food_version'])
+        self.last_day = day
+
+    def stop(self):
+        """Отключение от симуляции"""
+        if getattr(self.simulation, 'snapshot_recorder', None) is self:
+            self.simulation.snapshot_recorder = None
+
+    def save(self, path):
+        """Сохранение снимков в файл для последующей отрисовки"""
+        with open(path, 'wb') as file:
+            file.write(FILE_HEADER.pack(FILE_MAGIC, self.width, self.height))
+            for frame in self.frames:
+                file.write(FRAME_LENGTH.pack(len(frame)))
+                file.write(frame)
+
+
+def load_snapshots(path):
+    """Снимки из файла SnapshotRecorder.save: (ширина, высота, кадры)"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, width, height = FILE_HEADER.unpack_from(data)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{path} не является файлом снимков симуляции")
+    frames = []
+    offset = FILE_HEADER.size
+    while offset < len(data):
+        length, = FRAME_LENGTH.unpack_from(data, offset)
+        offset += FRAME_LENGTH.size
+        frames.append(data[offset:offset + length])
+        offset += length
+    return width, height, frames
+
+
+def _disk(radius):
+    """Смещения пикселей круга радиуса radius"""
+    span = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(span, span)
+    inside = dx ** 2 + dy ** 2 <= radius ** 2 + radius
+    return dx[inside], dy[inside]
+
+
+def rasterize(food, groups, scale=4, radius=1):
+    """Кадр в индексах PALETTE: карта еды и точки групп
+
+    food - карта еды (width, height), groups - словарь позиций групп
+    (N, 2). Ось y направлена вверх, как в AntVisualization. Каждая клетка
+    занимает scale x scale пикселей.
+    """
+    width, height = food.shape
+    levels = np.clip(food / FOOD_MAX * (FOOD_LEVELS - 1), 0, FOOD_LEVELS - 1).astype(np.uint8)
+    image = np.repeat(np.repeat(levels.T[::-1], scale, axis=0), scale, axis=1)
+    rows, columns = image.shape
+    dx, dy = _disk(radius)
+    for group in DRAW_ORDER:
+        positions = groups.get(group)
+        if positions is None or not len(positions):
+            continue
+        x = (positions[:, 0] * scale).astype(np.int64)
+        y = rows - 1 - (positions[:, 1] * scale).astype(np.int64)
+        px = (x[:, None] + dx).ravel()
+        py = (y[:, None] + dy).ravel()
+        inside = (px >= 0) & (px < columns) & (py >= 0) & (py < rows)
+        image[py[inside], px[inside]] = GROUP_INDEX[group]
+    return image
+
+
+def to_rgb(image):
+    """RGB-буфер (строки, столбцы, 3) uint8 из кадра в индексах палитры"""
+    return PALETTE[image]
+
+
+def _render_chunk(task):
+    """Отрисовка фрагмента кадров в рабочем процессе
+
+    С pattern кадры записываются в PNG-файлы и возвращается их число,
+    без него возвращаются кадры в индексах палитры.
+    """
+    width, height, food, frames, start, scale, radius, pattern = task
+    food = food.copy()
+    images = []
+    for number, frame in enumerate(frames, start):
+        decoded = decode_frame(frame)
+        food[decoded['food_index']] = decoded['food_value']
+        image = rasterize(food.reshape(width, height), decoded, scale, radius)
+        if pattern:
+            _save_png(image, pattern.format(number))
+        else:
+            images.append(image)
+    return len(frames) if pattern else images
+
+
+def _palette_image(image):
+    # putpalette переводит изображение из режима 'L' в 'P'
+    picture = _image_module().fromarray(image)
+    picture.putpalette(PALETTE.ravel().tolist())
+    return picture
+
+
+def _save_png(image, path):
+    _palette_image(image).save(path, optimize=False)
+
+
+def _tasks(width, height, frames, chunk, scale, radius, pattern):
+    """Задания для рабочих процессов: фрагменты кадров с начальной картой еды"""
+    starts = range(0, len(frames), chunk)
+    # Карта еды восстанавливается последовательно, но только на границах фрагментов
+    food = np.zeros(width * height, dtype=np.float32)
+    position = 0
+    for start in starts:
+        for frame in frames[position:start]:
+            decoded = decode_frame(frame)
+            food[decoded['food_index']] = decoded['food_value']
+        position = start
+        yield width, height, food.copy(), frames[start:start + chunk], start, scale, radius, pattern
+
+
+def render_frames(width, height, frames, scale=4, radius=1, workers=None, chunk=64):
+    """Кадры в индексах палитры по порядку, отрисованные в пуле процессов"""
+    with ProcessPoolExecutor(workers) as executor:
+        for images in executor.map(_render_chunk, _tasks(width, height, frames, chunk, scale, radius, None)):
+            yield from images
+
+
+def render(width, height, frames, output, scale=4, radius=1, workers=None, chunk=64, fps=20):
+    """Отрисовка снимков в последовательность PNG или анимированный файл
+
+    output - либо шаблон имени PNG с полем номера кадра
+    ('frames/day_{:05d}.png'), либо файл с расширением из
+    ANIMATED_FORMATS. PNG-файлы пишут сами рабочие процессы;
+    анимированный файл собирается из кадров в основном процессе.
+    Возвращает число кадров.
+    """
+    _image_module()
+    extension = os.path.splitext(output)[1].lower()
+    if extension in ANIMATED_FORMATS:
+        pictures = [_palette_image(image)
+                    for image in render_frames(width, height, frames, scale, radius, workers, chunk)]
+        if not pictures:
+            return 0
+        pictures[0].save(output, format='PNG' if extension == '.apng' else None, save_all=True,
+                         append_images=pictures[1:], duration=round(1000 / fps), loop=0)
+        return len(pictures)
+    if '{' not in output:
+        raise ValueError("Шаблон PNG должен содержать поле номера кадра, например 'day_{:05d}.png'")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with ProcessPoolExecutor(workers) as executor:
+        return sum(executor.map(_render_chunk, _tasks(width, height, frames, chunk, scale, radius, output)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отрисовка записанных снимков симуляции")
+    parser.add_argument('snapshots', help="Файл снимков (SnapshotRecorder.save)")
+    parser.add_argument('output', help="Шаблон PNG ('frames/day_{:05d}.png') или файл .gif/.webp/.apng")
+    parser.add_argument('--scale', type=int, default=4, help="Пикселей на клетку среды")
+    parser.add_argument('--radius', type=int, default=1, help="Радиус точки сущности в пикселях")
+    parser.add_argument('--workers', type=int, help="Число рабочих процессов")
+    parser.add_argument('--fps', type=int, default=20, help="Кадров в секунду анимации")
+    args = parser.parse_args(argv)
+    width, height, frames = load_snapshots(args.snapshots)
+    count = render(width, height, frames, args.output, args.scale, args.radius, args.workers, fps=args.fps)
+    print(f"Отрисовано кадров: {count}")
+
+
+if __name__ == "__main__":
+    main()
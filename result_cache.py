@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+
+import numpy as np
+
+from ant import TRAITS
+from scenario import DEFAULTS, build_simulation, scenario_config
+from trait_stats import QUANTILES, STATIC_TRAITS
+
+# Модули, от которых зависит траектория симуляции; их исходный код входит в ключ кэша
+MODEL_MODULES = ('ant', 'colony', 'combat', 'creatures', 'entity_list', 'environment', 'lattice', 'lineage',
+                 'pipeline', 'recorder', 'scenario', 'simulation', 'spatial', 'stats', 'timer_wheel', 'trait_stats')
+
+# Истории, которые хранит кэш, в виде массивов
+HISTORY_FIELDS = ('red_ants', 'black_ants', 'peaceful_creatures', 'predators', 'red_stats', 'black_stats',
+                  'red_quantiles', 'black_quantiles')
+
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+_code_version = None
+
+
+def code_version():
+    """Отпечаток кода модели: исходники MODEL_MODULES, версии NumPy и Python"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for name in MODEL_MODULES:
+            with open(find_spec(name).origin, 'rb') as file:
+                digest.update(name.encode() + b'\0' + file.read() + b'\0')
+        digest.update(f"numpy {np.__version__} python {platform.python_version()}".encode())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def normalize_config(config):
+    """Полный сценарий с значениями, приведенными к типам DEFAULTS
+
+    Так lattice=1 и lattice=True дают один и тот же ключ кэша.
+    """
+    config = scenario_config(**config)
+    for name, value in config.items():
+        default = DEFAULTS[name]
+        if isinstance(default, bool):
+            config[name] = bool(value)
+        elif isinstance(default, int) or (name == 'seed' and value is not None):
+            config[name] = int(value)
+    return config
+
+
+def parse_value(name, text):
+    """Значение параметра сценария из строки командной строки по типу DEFAULTS"""
+    if name not in DEFAULTS:
+        raise ValueError(f"Неизвестный параметр сценария: {name}")
+    if isinstance(DEFAULTS[name], bool):
+        lowered = text.strip().lower()
+        if lowered not in ('1', '0', 'true', 'false', 'yes', 'no'):
+            raise ValueError(f"Ожидалось логическое значение {name}: {text}")
+        return lowered in ('1', 'true', 'yes')
+    return int(text)
+
+
+def cache_key(config):
+    """Ключ запуска: хэш полного сценария (включая seed) и версии кода"""
+    payload = json.dumps({'config': normalize_config(config), 'code': code_version()}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _histories(simulation):
+    """Истории симуляции в виде массивов HISTORY_FIELDS"""
+    days = len(simulation.red_population_history)
+
+    def stats(history):
+        return np.array([[row[name] for name in TRAITS] for row in history], dtype=float).reshape(days, len(TRAITS))
+
+    def quantiles(history):
+        return np.array([[[row[trait][q] for q in QUANTILES] for trait in STATIC_TRAITS] for row in history],
+                        dtype=float).reshape(days, len(STATIC_TRAITS), len(QUANTILES))
+
+    creatures = simulation.creature_manager is not None
+    return {
+        'red_ants': np.array(simulation.red_population_history, dtype=np.int64),
+        'black_ants': np.array(simulation.black_population_history, dtype=np.int64),
+        'peaceful_creatures': np.array(simulation.peaceful_creatures_history if creatures else [], dtype=np.int64),
+        'predators': np.array(simulation.predator_history if creatures else [], dtype=np.int64),
+        'red_stats': stats(simulation.red_stats_history),
+        'black_stats': stats(simulation.black_stats_history),
+        'red_quantiles': quantiles(simulation.red_quantiles_history),
+        'black_quantiles': quantiles(simulation.black_quantiles_history),
+    }
+
+
+def final_stats(history, day):
+    """Статистика дня day в формате Simulation.get_stats, восстановленная по историям"""
+    if not 1 <= day <= len(history['red_ants']):
+        raise ValueError(f"В истории нет дня {day}")
+    row = day - 1
+
+    def quantiles(values):
+        return {trait: dict(zip(QUANTILES, values[index].tolist())) for index, trait in enumerate(STATIC_TRAITS)}
+
+    stats = {
+        'day': day,
+        'red_ants': int(history['red_ants'][row]),
+        'black_ants': int(history['black_ants'][row]),
+        'red_stats': dict(zip(TRAITS, history['red_stats'][row].tolist())),
+        'black_stats': dict(zip(TRAITS, history['black_stats'][row].tolist())),
+        'red_quantiles': quantiles(history['red_quantiles'][row]),
+        'black_quantiles': quantiles(history['black_quantiles'][row]),
+    }
+    if len(history['peaceful_creatures']):
+        stats['peaceful_creatures'] = int(history['peaceful_creatures'][row])
+        stats['predators'] = int(history['predators'][row])
+    return stats
+
+
+def _checkpoint(simulation):
+    """Сжатое состояние симуляции с генераторами случайных чисел, без историй
+
+    Истории хранятся в кэше отдельно, поэтому в контрольную точку не
+    попадают; продолженный расчет дописывает только новые дни.
+    """
+    names = [name for name in vars(simulation) if name.endswith('_history')]
+    saved = {name: getattr(simulation, name) for name in names}
+    try:
+        for name in names:
+            setattr(simulation, name, [])
+        state = pickle.dumps((simulation, random.getstate(), np.random.get_state()), pickle.HIGHEST_PROTOCOL)
+    finally:
+        for name, value in saved.items():
+            setattr(simulation, name, value)
+    return zlib.compress(state)
+
+
+def _restore(checkpoint):
+    simulation, random_state, numpy_state = pickle.loads(zlib.decompress(checkpoint))
+    random.setstate(random_state)
+    np.random.set_state(numpy_state)
+    return simulation
+
+
+def _run(config, days, checkpoint=None, history=None):
+    """Расчет запуска до дня days, с нуля или от контрольной точки
+
+    Выполняется в рабочем процессе; возвращает истории всех дней и новую
+    контрольную точку.
+    """
+    simulation = build_simulation(**config) if checkpoint is None else _restore(checkpoint)
+    simulation.run(days - simulation.day)
+    new = _histories(simulation)
+    if history is not None:
+        new = {name: np.concatenate((history[name], new[name])) for name in HISTORY_FIELDS}
+    return new, _checkpoint(simulation)
+
+
+class ResultCache:
+    """Кэш результатов запусков на диске с вытеснением давно не использованных
+
+    Запись - сжатый файл .npz с именем-ключом cache_key: истории всех
+    рассчитанных дней и контрольная точка на последнем дне. Запрос
+    не дальше рассчитанного дня обслуживается из историй, запрос дальше -
+    продолжением расчета от контрольной точки. Время последнего
+    использования - время изменения файла; при превышении max_bytes
+    удаляются самые давние записи.
+    """
+
+    def __init__(self, directory='.ant_cache', max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """(рассчитанные дни, истории, контрольная точка) записи или None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                history = {name: data[name] for name in HISTORY_FIELDS}
+                checkpoint = data['checkpoint'].tobytes()
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        os.utime(path)
+        return len(history['red_ants']), history, checkpoint
+
+    def store(self, key, config, history, checkpoint):
+        """Атомарная запись результата и вытеснение по размеру"""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, config=np.array(json.dumps(config, sort_keys=True)), code=np.array(code_version()),
+                            checkpoint=np.frombuffer(checkpoint, dtype=np.uint8), **history)
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(buffer.getvalue())
+        os.replace(temporary, self._path(key))
+        self.evict(keep=key)
+
+    def entries(self):
+        """Записи кэша (время использования, размер, путь) от давних к недавним"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                status = entry.stat()
+                found.append((status.st_mtime, status.st_size, entry.path))
+        return sorted(found)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Удаление давно не использованных записей сверх max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self._path(keep):
+                continue
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def run_batch(configs, days, cache=None, workers=None):
+    """Результаты сценариев configs на день days с использованием кэша
+
+    Полные попадания возвращаются без расчета, частичные продолжаются от
+    контрольной точки, остальные считаются с нуля; расчеты идут в пуле
+    процессов, одинаковые сценарии пакета считаются один раз. Сценарии
+    без seed не воспроизводимы и не кэшируются.
+    Возвращает список словарей с ключами config, stats (формат
+    get_stats), history и cache ('hit', 'partial', 'miss' или 'bypass').
+    """
+    if days < 1:
+        raise ValueError("Число дней должно быть не меньше 1")
+    cache = cache or ResultCache()
+    configs = [normalize_config(config) for config in configs]
+    results = [None] * len(configs)
+    jobs = {}  # ключ (или индекс для некэшируемых) -> (статус, аргументы _run, индексы сценариев)
+    for index, config in enumerate(configs):
+        key = cache_key(config) if config['seed'] is not None else None
+        if key in jobs:
+            # Одинаковые сценарии в пакете считаются один раз
+            jobs[key][2].append(index)
+            continue
+        entry = cache.load(key) if key else None
+        if entry and entry[0] >= days:
+            results[index] = ({name: values[:days] for name, values in entry[1].items()}, 'hit')
+        elif entry:
+            jobs[key] = ('partial', (config, days, entry[2], entry[1]), [index])
+        else:
+            jobs[key or index] = ('miss' if key else 'bypass', (config, days), [index])
+
+    if jobs:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = {job: executor.submit(_run, *arguments) for job, (_, arguments, _) in jobs.items()}
+            for job, future in futures.items():
+                status, _, indices = jobs[job]
+                history, checkpoint = future.result()
+                if status != 'bypass':
+                    cache.store(job, configs[indices[0]], history, checkpoint)
+                for index in indices:
+                    results[index] = (history, status)
+
+    return [{'config': config, 'stats': final_stats(history, days), 'history': history, 'cache': status}
+            for config, (history, status) in zip(configs, results)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный запуск сценариев с кэшем результатов")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help="Зерна запусков")
+    parser.add_argument('--days', type=int, default=200, help="Число дней каждого запуска")
+    parser.add_argument('--set', action='append', default=[], metavar='ПАРАМЕТР=ЗНАЧЕНИЕ',
+                        help="Параметр сценария (width, red_ants, lattice=true, ...), можно повторять")
+    parser.add_argument('--cache-dir', default='.ant_cache', help="Каталог кэша")
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_BYTES // 2**20, help="Размер кэша, МБ")
+    parser.add_argument('--workers', type=int, help="Число рабочих процессов")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        try:
+            overrides[name] = parse_value(name, value)
+        except ValueError as error:
+            parser.error(str(error))
+    configs = [dict(overrides, seed=seed) for seed in args.seeds]
+    cache = ResultCache(args.cache_dir, args.max_size * 2**20)
+    for result in run_batch(configs, args.days, cache, args.workers):
+        stats = result['stats']
+        print(f"seed={result['config']['seed']}: красные {stats['red_ants']}, черные {stats['black_ants']} "
+              f"[{result['cache']}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+
+from ant import RedAnt, BlackAnt
+from colony import Colony
+from creatures import CreatureManager
+from environment import Environment
+from simulation import Simulation
+
+# Параметры сценария по умолчанию
+DEFAULTS = {
+    'width': 100,
+    'height': 100,
+    'food': 1000,
+    'red_ants': 50,
+    'black_ants': 50,
+    'peaceful': 0,
+    'predators': 0,
+    'seed': None,
+    'lattice': False,  # Решеточный режим среды (целые позиции, сетки занятости)
+}
+
+
+def scenario_config(**overrides):
+    """Полный набор параметров сценария: значения по умолчанию и overrides"""
+    unknown = set(overrides) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры сценария: {', '.join(sorted(unknown))}")
+    config = dict(DEFAULTS)
+    config.update(overrides)
+    return config
+
+
+def build_simulation(**overrides):
+    """Создание симуляции по параметрам сценария
+
+    Если задан seed, им инициализируются оба генератора случайных чисел
+    (random и numpy.random), так что сценарий воспроизводится.
+    """
+    config = scenario_config(**overrides)
+    if config['seed'] is not None:
+        random.seed(config['seed'])
+        np.random.seed(config['seed'])
+
+    environment = Environment(config['width'], config['height'], initial_food=config['food'],
+                              lattice=config['lattice'])
+    red_colony = Colony(RedAnt, config['red_ants'], environment)
+    black_colony = Colony(BlackAnt, config['black_ants'], environment)
+
+    creature_manager = None
+    if config['peaceful'] or config['predators']:
+        creature_manager = CreatureManager(environment)
+        creature_manager.add_peaceful_creatures(config['peaceful'])
+        creature_manager.add_predators(config['predators'])
+
+    return Simulation(environment, red_colony, black_colony, creature_manager)
@@ -0,0 +1,521 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ant import TRAITS
+from environment import prefer_full_map, tile_cells
+from scenario import build_simulation, scenario_config
+
+# Сообщение протокола: длина полезной нагрузки, тип и сама нагрузка
+MESSAGE_HEADER = struct.Struct('>IB')
+JSON_MESSAGE = ord('J')
+FRAME_MESSAGE = ord('F')
+
+# Заголовок кадра: ID запуска, день, размеры групп и число изменившихся клеток еды
+FRAME_HEADER = struct.Struct('<7I')
+FRAME_GROUPS = ('red', 'black', 'peaceful', 'predators')
+
+logger = logging.getLogger(__name__)
+
+
+# Запуски, размещенные в рабочем процессе: ID запуска -> _Resident
+_RESIDENT = {}
+
+
+class _Resident:
+    """Симуляция запуска в рабочем процессе
+
+    Запуски одного процесса делят глобальные генераторы random и
+    np.random, поэтому у каждого запуска свое сохраненное состояние
+    генераторов: оно подставляется на время его шагов. food_source -
+    среда и версия еды, которые уже получил сервис.
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.rng = _rng_state()
+        self.food_source = None
+
+
+def _rng_state():
+    return random.getstate(), np.random.get_state()
+
+
+def _swap_rng(state):
+    """Установка состояния генераторов random и np.random; возвращает прежнее"""
+    previous = _rng_state()
+    random.setstate(state[0])
+    np.random.set_state(state[1])
+    return previous
+
+
+def _view(simulation, food=True):
+    """Данные для кадров и запросов: позиции групп, карта еды с версиями фрагментов и статистика
+
+    С food=False карта еды в представление не входит.
+    """
+    environment = simulation.environment
+    view = {
+        'day': simulation.day,
+        'red': simulation.red_colony.ants.positions().astype(np.float32),
+        'black': simulation.black_colony.ants.positions().astype(np.float32),
+        'food_version': environment.food_version,
+        'food_tiles': environment.tile_versions.copy(),
+        'food_tile': environment.tile,
+        'stats': simulation.get_stats(),
+    }
+    if food:
+        view['food'] = environment.food_map.astype(np.float32)
+    creature_manager = simulation.creature_manager
+    for name, store in (('peaceful', creature_manager and creature_manager.peaceful_creatures),
+                        ('predators', creature_manager and creature_manager.predators)):
+        if store:
+            view[name] = store.positions()[store.alive[:store.count]].astype(np.float32)
+        else:
+            view[name] = np.zeros((0, 2), dtype=np.float32)
+    return view
+
+
+def _resident_view(resident):
+    """Представление запуска для сервиса: вместо карты еды - только изменившиеся фрагменты
+
+    food_cells - плоские индексы клеток фрагментов, изменившихся с
+    прошлого представления, food_values - еда в них. Для первого
+    представления или при изменении большей части карты food_cells -
+    None, а food_values - вся карта.
+    """
+    environment = resident.simulation.environment
+    view = _view(resident.simulation, food=False)
+    source = resident.food_source
+    cells = environment.dirty_cells(source[1]) if source and source[0] is environment else None
+    if cells is None:
+        view['food_cells'], view['food_values'] = None, environment.food_map.astype(np.float32)
+    else:
+        view['food_cells'], view['food_values'] = cells, environment.food_map.ravel()[cells].astype(np.float32)
+    resident.food_source = (environment, environment.food_version)
+    return view
+
+
+def _create_run(run_id, config):
+    """Создание симуляции в рабочем процессе запуска"""
+    outer = _rng_state()
+    # build_simulation засевает глобальные генераторы; их состояние становится состоянием запуска
+    resident = _RESIDENT[run_id] = _Resident(build_simulation(**config))
+    _swap_rng(outer)
+    return _resident_view(resident)
+
+
+def _step_run(run_id, ticks):
+    """Выполнение ticks шагов симуляции в рабочем процессе; наружу уходит только представление"""
+    resident = _RESIDENT[run_id]
+    outer = _swap_rng(resident.rng)
+    try:
+        for _ in range(ticks):
+            resident.simulation.update()
+    finally:
+        resident.rng = _swap_rng(outer)
+    return _resident_view(resident)
+
+
+def _close_run(run_id):
+    """Удаление симуляции запуска из рабочего процесса"""
+    _RESIDENT.pop(run_id, None)
+
+
+def _changed_food(view, food_before, since):
+    """Плоские индексы клеток, в которых еда отличается от food_before"""
+    food = view['food'].ravel()
+    if food_before is None:
+        return np.flatnonzero(food)
+    width, height = view['food'].shape
+    dirty = None if since is None or 'food_tiles' not in view else view['food_tiles'] > since
+    if dirty is None or prefer_full_map(dirty, width, height):
+        return np.flatnonzero(food != food_before.ravel())
+    # Сравниваются только клетки фрагментов, изменившихся после версии since
+    cells = tile_cells(dirty, view['food_tile'], width, height)
+    return np.sort(cells[food[cells] != food_before.ravel()[cells]])
+
+
+def encode_frame(run_id, view, food_before=None, since=None):
+    """Двоичный кадр: позиции групп, изменения еды относительно food_before и средние признаки
+
+    Без food_before в кадр попадают все непустые клетки карты еды. since -
+    версия еды (view['food_version']), при которой снята food_before: с ней
+    сравниваются только изменившиеся фрагменты карты, а не вся карта.
+    """
+    return _pack_frame(run_id, view, _changed_food(view, food_before, since))
+
+
+def _pack_frame(run_id, view, changed):
+    """Кадр encode_frame с заданными индексами изменившихся клеток еды"""
+    food = view['food'].ravel()
+    changed = changed.astype('<i4')
+    stats = view['stats']
+    traits = np.array([stats[side][name] for side in ('red_stats', 'black_stats') for name in TRAITS],
+                      dtype='<f4')
+    groups = [view[name] for name in FRAME_GROUPS]
+    header = FRAME_HEADER.pack(run_id, view['day'], *(len(group) for group in groups), len(changed))
+    return b''.join([header] + [group.astype('<f4').tobytes() for group in groups] +
+                    [changed.tobytes(), food[changed].astype('<f4').tobytes(), traits.tobytes()])
+
+
+def decode_frame(data):
+    """Разбор кадра encode_frame в словарь массивов NumPy"""
+    run_id, day, *sizes, changed = FRAME_HEADER.unpack_from(data)
+    frame = {'run_id': run_id, 'day': day}
+    offset = FRAME_HEADER.size
+    for name, size in zip(FRAME_GROUPS, sizes):
+        frame[name] = np.frombuffer(data, '<f4', size * 2, offset).reshape(-1, 2)
+        offset += size * 8
+    frame['food_index'] = np.frombuffer(data, '<i4', changed, offset)
+    offset += changed * 4
+    frame['food_value'] = np.frombuffer(data, '<f4', changed, offset)
+    offset += changed * 4
+    traits = np.frombuffer(data, '<f4', 2 * len(TRAITS), offset)
+    frame['red_stats'] = dict(zip(TRAITS, traits[:len(TRAITS)].tolist()))
+    frame['black_stats'] = dict(zip(TRAITS, traits[len(TRAITS):].tolist()))
+    return frame
+
+
+def _message(kind, payload):
+    return MESSAGE_HEADER.pack(len(payload), kind) + payload
+
+
+async def read_message(reader):
+    """Чтение одного сообщения протокола: (тип, нагрузка)"""
+    length, kind = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class _Subscriber:
+    """Подписка соединения на кадры одного запуска
+
+    Хранится только последнее неотправленное состояние: медленный клиент
+    получает кадры реже, но всегда актуальные, а изменения еды считаются
+    относительно карты, которую он действительно получил. Эта карта -
+    собственная копия подписки, в ней обновляются только отправленные
+    клетки.
+    """
+
+    def __init__(self, run_id, writer):
+        self.run_id = run_id
+        self.writer = writer
+        self.food = None  # Карта еды, которую получил клиент
+        self.food_version = None  # и версия еды, на которой она снята
+        self.latest = None
+        self.ready = asyncio.Event()
+        self.dropped = 0  # Сколько состояний заменено более новыми до отправки
+        self.task = asyncio.create_task(self._pump())
+
+    def offer(self, view):
+        if self.latest is not None:
+            self.dropped += 1
+        self.latest = view
+        self.ready.set()
+
+    async def _pump(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            view, self.latest = self.latest, None
+            food = view['food']
+            changed = _changed_food(view, self.food, self.food_version)
+            frame = _pack_frame(self.run_id, view, changed)
+            if self.food is None:
+                self.food = food.copy()
+            else:
+                self.food.ravel()[changed] = food.ravel()[changed]
+            self.food_version = view['food_version']
+            try:
+                self.writer.write(_message(FRAME_MESSAGE, frame))
+                await self.writer.drain()
+            except ConnectionError:
+                return  # Клиент отключился; подписка снимается обработчиком завершения задачи
+
+    def close(self):
+        self.task.cancel()
+
+
+class _Run:
+    """Запуск симуляции, размещенный в сервисе"""
+
+    def __init__(self, run_id, config, worker):
+        self.run_id = run_id
+        self.config = config
+        self.worker = worker  # Рабочий процесс, в котором живет симуляция запуска
+        self.food = None  # Карта еды, собранная из изменившихся фрагментов
+        self.view = None
+        self.paused = True
+        self.task = None  # Цикл режима run; не больше одного на запуск
+        self.error = None  # Последняя ошибка цикла, остановившая запуск
+        self.lock = asyncio.Lock()
+        self.subscribers = []
+
+    def apply(self, view):
+        """Новое представление рабочего процесса: фрагменты еды переносятся в карту запуска"""
+        cells, values = view.pop('food_cells'), view.pop('food_values')
+        if cells is None:
+            self.food = values
+        else:
+            self.food.ravel()[cells] = values
+        view['food'] = self.food
+        self.view = view
+
+
+class SimulationService:
+    """Локальный сервис, управляющий множеством симуляций по ID
+
+    Команды приходят JSON-сообщениями, а подписчикам рассылаются двоичные
+    кадры encode_frame. Запуски живут в ограниченном наборе из workers
+    рабочих процессов (worker_factory создает исполнителя с одним
+    процессом; процессы создаются по мере надобности) и закрепляются за
+    процессом по ID. Туда уходят только команды, обратно - представления
+    без карты еды, с одними изменившимися фрагментами, так что ни
+    стоимость шага, ни работа цикла событий не растут с размером карты.
+    Цикл событий только пересылает данные, поэтому десятки запусков можно
+    наблюдать одновременно.
+    """
+
+    def __init__(self, worker_factory=None, batch=10, workers=None):
+        self.worker_factory = worker_factory or functools.partial(ProcessPoolExecutor, 1)
+        self.batch = batch  # Шагов за одно обращение к процессу в режиме run
+        self.workers = [None] * (workers or os.cpu_count() or 1)
+        self.runs = {}
+        self.next_id = 1
+
+    def _worker(self, run_id):
+        """Рабочий процесс, за которым закреплен запуск"""
+        slot = run_id % len(self.workers)
+        if self.workers[slot] is None:
+            self.workers[slot] = self.worker_factory()
+        return self.workers[slot]
+
+    @staticmethod
+    async def _call(worker, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(worker, function, *args)
+
+    def _get_run(self, params):
+        run = self.runs.get(params.get('id'))
+        if run is None:
+            raise ValueError(f"Нет запуска с ID {params.get('id')}")
+        return run
+
+    async def _step(self, run, ticks):
+        async with run.lock:
+            run.apply(await self._call(run.worker, _step_run, run.run_id, ticks))
+        for subscriber in run.subscribers:
+            subscriber.offer(run.view)
+
+    async def _run_loop(self, run, batch):
+        while not run.paused:
+            await self._step(run, batch)
+
+    @staticmethod
+    def _loop_done(run, task):
+        """Завершение цикла запуска: ошибка записывается, запуск ставится на паузу"""
+        if task.cancelled() or task.exception() is None:
+            return
+        run.paused = True
+        run.error = f"{type(task.exception()).__name__}: {task.exception()}"
+        logger.error("Запуск %s остановлен ошибкой", run.run_id, exc_info=task.exception())
+
+    @staticmethod
+    def _subscriber_done(run, subscriber, task):
+        """Снятие подписки, задача отправки которой завершилась"""
+        if subscriber in run.subscribers:
+            run.subscribers.remove(subscriber)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Подписка на запуск %s прервана ошибкой", run.run_id, exc_info=task.exception())
+
+    async def cmd_create(self, params, writer):
+        config = scenario_config(**params.get('config', {}))
+        if config['seed'] is None:
+            # Иначе запуски в разветвленных рабочих процессах совпадут
+            config['seed'] = random.randrange(2 ** 32)
+        run_id = self.next_id
+        self.next_id += 1
+        run = _Run(run_id, config, self._worker(run_id))
+        run.apply(await self._call(run.worker, _create_run, run_id, config))
+        self.runs[run_id] = run
+        return {'id': run_id, 'config': config, 'stats': run.view['stats']}
+
+    async def cmd_step(self, params, writer):
+        run = self._get_run(params)
+        await self._step(run, int(params.get('ticks', 1)))
+        return {'id': run.run_id, 'stats': run.view['stats']}
+
+    async def cmd_run(self, params, writer):
+        run = self._get_run(params)
+        batch = int(params.get('batch', self.batch))
+        run.paused = False
+        run.error = None
+        # Прежний цикл, ожидающий шага после pause, снова увидит paused == False и продолжит сам
+        if run.task is None or run.task.done():
+            run.task = asyncio.create_task(self._run_loop(run, batch))
+            run.task.add_done_callback(functools.partial(self._loop_done, run))
+        return {'id': run.run_id, 'paused': run.paused}
+
+    async def cmd_pause(self, params, writer):
+        run = self._get_run(params)
+        run.paused = True
+        return {'id': run.run_id, 'paused': run.paused}
+
+    async def cmd_query(self, params, writer):
+        run = self._get_run(params)
+        dropped = sum(subscriber.dropped for subscriber in run.subscribers)
+        return {'id': run.run_id, 'paused': run.paused, 'stats': run.view['stats'],
+                'subscribers': len(run.subscribers), 'dropped_frames': dropped, 'error': run.error}
+
+    async def cmd_list(self, params, writer):
+        return {'runs': [{'id': run.run_id, 'day': run.view['day'], 'paused': run.paused}
+                         for run in self.runs.values()]}
+
+    async def cmd_subscribe(self, params, writer):
+        run = self._get_run(params)
+        subscriber = _Subscriber(run.run_id, writer)
+        subscriber.task.add_done_callback(functools.partial(self._subscriber_done, run, subscriber))
+        run.subscribers.append(subscriber)
+        subscriber.offer(run.view)  # Первый кадр содержит всю карту еды
+        return {'id': run.run_id}
+
+    async def cmd_unsubscribe(self, params, writer):
+        run = self._get_run(params)
+        self._unsubscribe(run, writer)
+        return {'id': run.run_id}
+
+    async def cmd_close(self, params, writer):
+        run = self._get_run(params)
+        run.paused = True
+        if run.task is not None:
+            run.task.cancel()
+        for subscriber in list(run.subscribers):
+            subscriber.close()
+        del self.runs[run.run_id]
+        async with run.lock:
+            await self._call(run.worker, _close_run, run.run_id)
+        return {'id': run.run_id}
+
+    def _unsubscribe(self, run, writer):
+        for subscriber in [s for s in run.subscribers if s.writer is writer]:
+            subscriber.close()
+            run.subscribers.remove(subscriber)
+
+    async def handle(self, reader, writer):
+        """Обработка соединения: команды выполняются по очереди, ответы идут в том же порядке"""
+        try:
+            while True:
+                try:
+                    kind, payload = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if kind != JSON_MESSAGE:
+                    continue
+                try:
+                    request = json.loads(payload)
+                    if not isinstance(request, dict):
+                        raise ValueError("Команда должна быть объектом JSON")
+                    command = getattr(self, f"cmd_{request.get('cmd')}", None)
+                    if command is None:
+                        raise ValueError(f"Неизвестная команда: {request.get('cmd')}")
+                    response = {'ok': True, **await command(request, writer)}
+                except (json.JSONDecodeError, AttributeError, ValueError, TypeError) as error:
+                    # Ошибка одной команды не должна разрывать соединение и его подписки
+                    response = {'ok': False, 'error': str(error)}
+                writer.write(_message(JSON_MESSAGE, json.dumps(response).encode()))
+                await writer.drain()
+        finally:
+            for run in self.runs.values():
+                self._unsubscribe(run, writer)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        """Запуск сервера на TCP-порту или Unix-сокете path"""
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Остановка циклов всех запусков и рабочих процессов"""
+        for run in self.runs.values():
+            run.paused = True
+            if run.task is not None:
+                run.task.cancel()
+        self.runs = {}
+        for worker in self.workers:
+            if worker is not None:
+                worker.shutdown(wait=False, cancel_futures=True)
+        self.workers = [None] * len(self.workers)
+
+
+class SimulationClient:
+    """Клиент сервиса: команды с ожиданием ответа и поток разобранных кадров"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.responses = asyncio.Queue()
+        self.frames = asyncio.Queue()
+        self.task = asyncio.create_task(self._dispatch())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765, path=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _dispatch(self):
+        while True:
+            try:
+                kind, payload = await read_message(self.reader)
+            except asyncio.IncompleteReadError:
+                break
+            if kind == JSON_MESSAGE:
+                await self.responses.put(json.loads(payload))
+            elif kind == FRAME_MESSAGE:
+                await self.frames.put(decode_frame(payload))
+
+    async def request(self, cmd, **params):
+        """Отправка команды и ожидание ответа"""
+        self.writer.write(_message(JSON_MESSAGE, json.dumps({'cmd': cmd, **params}).encode()))
+        await self.writer.drain()
+        return await self.responses.get()
+
+    async def next_frame(self):
+        return await self.frames.get()
+
+    async def close(self):
+        self.task.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный сервис симуляций муравьев")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="Путь Unix-сокета вместо TCP")
+    parser.add_argument('--batch', type=int, default=10, help="Шагов за одно обращение к процессу запуска")
+    parser.add_argument('--workers', type=int, help="Число рабочих процессов (по умолчанию - число ядер)")
+    args = parser.parse_args()
+    service = SimulationService(batch=args.batch, workers=args.workers)
+    asyncio.run(service.serve(args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import json
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from ant import TRAITS
+
+# Группы и столбцы их таблиц: координаты, затем признаки
+GROUP_COLUMNS = {
+    'red': ('x', 'y') + TRAITS,
+    'black': ('x', 'y') + TRAITS,
+    'peaceful': ('x', 'y', 'health', 'damage', 'speed', 'size', 'age'),
+    'predators': ('x', 'y', 'health', 'damage', 'speed', 'size', 'age'),
+}
+
+# Поля заголовка (int64): счетчик seqlock, день, поколение блоков, размеры
+# среды, длина и емкость статистики, версия еды, затем численность и емкость каждой группы
+HEADER_FIELDS = (('seq', 'day', 'generation', 'width', 'height', 'stats_length', 'stats_capacity', 'food_version') +
+                 tuple(f'{group}_{field}' for group in GROUP_COLUMNS for field in ('count', 'capacity')))
+FIELD = {name: index for index, name in enumerate(HEADER_FIELDS)}
+
+STATS_CAPACITY = 1 << 16  # Начальный размер блока под JSON статистики, байт
+
+
+# Блоки, созданные писателями этого процесса: их регистрацию в трекере ресурсов трогать нельзя
+_created = set()
+
+
+def _create(name, size):
+    block = shared_memory.SharedMemory(name, create=True, size=size)
+    _created.add(name)
+    return block
+
+
+def _unlink(block):
+    _created.discard(block.name)
+    block.close()
+    block.unlink()
+
+
+def _attach(name):
+    """Подключение к существующему блоку без передачи его трекеру ресурсов процесса"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # До Python 3.13 подключение регистрирует блок в трекере ресурсов,
+        # и тот удалил бы чужой блок при выходе читателя
+        block = shared_memory.SharedMemory(name)
+        if name not in _created:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+def _group_columns(simulation):
+    """Таблицы (число, столбцы) групп текущего состояния симуляции"""
+    tables = {}
+    for group, colony in (('red', simulation.red_colony), ('black', simulation.black_colony)):
+        ants = colony.ants
+        tables[group] = [ants.positions()[:, 0], ants.positions()[:, 1]] + [ants.column(name) for name in TRAITS]
+    creature_manager = simulation.creature_manager
+    for group in ('peaceful', 'predators'):
+        store = getattr(creature_manager, 'peaceful_creatures' if group == 'peaceful' else 'predators', None)
+        if store is None:
+            tables[group] = [np.zeros(0) for _ in GROUP_COLUMNS[group]]
+            continue
+        alive = store.alive[:store.count]
+        positions = store.position[:store.count][alive]
+        tables[group] = [positions[:, 0], positions[:, 1]] + [
+            getattr(store, name)[:store.count][alive] for name in GROUP_COLUMNS[group][2:]
+        ]
+    return tables
+
+
+class SharedStateExporter:
+    """Публикация состояния симуляции в именованные блоки shared_memory
+
+    После каждого дня в блоки копируются позиции и признаки колоний и
+    существ, food_map и статистика. Запись обрамляется счетчиком seqlock
+    в заголовке: нечетное значение означает, что запись идет. Если
+    группа или статистика перестает помещаться в свой блок, блоки групп и
+    статистики создаются заново с удвоенной емкостью и растет поколение в
+    заголовке; читатели при этом переподключаются. Имена блоков:
+    '<name>_header', '<name>_food', '<name>_<группа>_<поколение>',
+    '<name>_stats_<поколение>'. Из карты еды копируются
+    только фрагменты, изменившиеся после прошлой публикации; поле
+    food_version заголовка растет при каждом изменении карты, так что
+    читатель может не копировать карту, если версия прежняя.
+    """
+
+    def __init__(self, simulation, name, capacity=1024):
+        self.simulation = simulation
+        self.name = name
+        environment = simulation.environment
+        self.header_block = _create(f'{name}_header', 8 * len(HEADER_FIELDS))
+        self.header = np.ndarray(len(HEADER_FIELDS), dtype=np.int64, buffer=self.header_block.buf)
+        self.header[:] = 0
+        self.header[FIELD['width']] = environment.width
+        self.header[FIELD['height']] = environment.height
+        self.food_block = _create(f'{name}_food', 8 * environment.width * environment.height)
+        self.food = np.ndarray((environment.width, environment.height), dtype=np.float64, buffer=self.food_block.buf)
+        self.food_source = None  # Среда и версия еды последней публикации
+        self.stats_block = None
+        self.group_blocks = {}
+        self.tables = {}
+        self._allocate({group: capacity for group in GROUP_COLUMNS}, STATS_CAPACITY)
+        simulation.state_exporter = self
+        self.publish()
+
+    def _allocate(self, capacities, stats_capacity):
+        """Создание блоков групп и статистики нового поколения"""
+        old_blocks = [*self.group_blocks.values(), *([self.stats_block] if self.stats_block else [])]
+        generation = int(self.header[FIELD['generation']]) + 1
+        for group, capacity in capacities.items():
+            columns = len(GROUP_COLUMNS[group])
+            block = _create(f'{self.name}_{group}_{generation}', 8 * columns * capacity)
+            self.group_blocks[group] = block
+            self.tables[group] = np.ndarray((capacity, columns), dtype=np.float64, buffer=block.buf)
+            self.header[FIELD[f'{group}_capacity']] = capacity
+        self.stats_block = _create(f'{self.name}_stats_{generation}', stats_capacity)
+        self.header[FIELD['stats_capacity']] = stats_capacity
+        self.header[FIELD['generation']] = generation
+        for block in old_blocks:
+            _unlink(block)
+
+    def publish(self):
+        """Запись текущего состояния; вызывается симуляцией в конце дня"""
+        simulation = self.simulation
+        tables = _group_columns(simulation)
+        stats = json.dumps(simulation.get_stats()).encode()
+
+        header = self.header
+        header[FIELD['seq']] += 1  # Нечетный счетчик: запись идет
+        needed = {group: len(columns[0]) for group, columns in tables.items()}
+        stats_capacity = int(header[FIELD['stats_capacity']])
+        if (len(stats) > stats_capacity or
+                any(count > header[FIELD[f'{group}_capacity']] for group, count in needed.items())):
+            self._allocate({group: max(2 * count, int(header[FIELD[f'{group}_capacity']]))
+                            for group, count in needed.items()},
+                           max(2 * len(stats), stats_capacity))
+        for group, columns in tables.items():
+            count = needed[group]
+            table = self.tables[group]
+            for index, values in enumerate(columns):
+                table[:count, index] = values
+            header[FIELD[f'{group}_count']] = count
+        self._publish_food(simulation.environment)
+        self.stats_block.buf[:len(stats)] = stats
+        header[FIELD['stats_length']] = len(stats)
+        header[FIELD['day']] = simulation.day
+        header[FIELD['seq']] += 1  # Четный счетчик: кадр согласован
+
+    def _publish_food(self, environment):
+        """Копирование изменившихся фрагментов карты еды; после перемотки или крупных изменений - всей карты"""
+        previous = self.food_source
+        if previous and previous[0] is environment and environment.food_version == previous[1]:
+            return
+        cells = environment.dirty_cells(previous[1]) if previous and previous[0] is environment else None
+        if cells is None:
+            self.food[:] = environment.food_map
+        else:
+            self.food.ravel()[cells] = environment.food_map.ravel()[cells]
+        self.food_source = (environment, environment.food_version)
+        self.header[FIELD['food_version']] += 1
+
+    def close(self):
+        """Отключение от симуляции и удаление всех блоков"""
+        if getattr(self.simulation, 'state_exporter', None) is self:
+            self.simulation.state_exporter = None
+        del self.header, self.food, self.tables
+        for block in [self.header_block, self.food_block, self.stats_block, *self.group_blocks.values()]:
+            _unlink(block)
+        self.group_blocks = {}
+
+
+class SharedStateReader:
+    """Чтение состояния, опубликованного SharedStateExporter, из другого процесса"""
+
+    def __init__(self, name):
+        self.name = name
+        self.header_block = _attach(f'{name}_header')
+        self.header = np.ndarray(len(HEADER_FIELDS), dtype=np.int64, buffer=self.header_block.buf)
+        width, height = int(self.header[FIELD['width']]), int(self.header[FIELD['height']])
+        self.food_block = _attach(f'{name}_food')
+        self.food = np.ndarray((width, height), dtype=np.float64, buffer=self.food_block.buf)
+        self.stats_block = None
+        self.generation = None
+        self.group_blocks = {}
+        self.tables = {}
+
+    def _attach_groups(self, generation):
+        """Подключение к блокам групп и статистики поколения generation"""
+        self._close_groups()
+        for group, columns in GROUP_COLUMNS.items():
+            block = _attach(f'{self.name}_{group}_{generation}')
+            capacity = block.size // (8 * len(columns))
+            self.group_blocks[group] = block
+            self.tables[group] = np.ndarray((capacity, len(columns)), dtype=np.float64, buffer=block.buf)
+        self.stats_block = _attach(f'{self.name}_stats_{generation}')
+        self.generation = generation
+
+    def _close_groups(self):
+        self.tables = {}
+        for block in [*self.group_blocks.values(), *([self.stats_block] if self.stats_block else [])]:
+            block.close()
+        self.group_blocks = {}
+        self.stats_block = None
+        self.generation = None
+
+    def views(self):
+        """Массивы-представления без копирования и значение счетчика seqlock
+
+        Данные представлений согласованы, только если после работы с ними
+        consistent(seq) возвращает True.
+        """
+        seq = int(self.header[FIELD['seq']])
+        generation = int(self.header[FIELD['generation']])
+        if generation != self.generation:
+            try:
+                self._attach_groups(generation)
+            except FileNotFoundError:
+                # Писатель уже создал следующее поколение
+                return None, seq | 1
+        frame = {'day': int(self.header[FIELD['day']]), 'food_version': int(self.header[FIELD['food_version']]),
+                 'food': self.food}
+        for group, columns in GROUP_COLUMNS.items():
+            count = min(int(self.header[FIELD[f'{group}_count']]), len(self.tables[group]))
+            frame[group] = self.tables[group][:count]
+        return frame, seq
+
+    def consistent(self, seq):
+        """Не было ли записи с момента views(), вернувшего seq"""
+        return seq % 2 == 0 and int(self.header[FIELD['seq']]) == seq
+
+    def read(self, timeout=1.0):
+        """Согласованная копия последнего кадра: группы, еда и статистика"""
+        deadline = time.monotonic() + timeout
+        while True:
+            frame, seq = self.views()
+            if frame is not None and seq % 2 == 0:
+                copy = {name: value.copy() if isinstance(value, np.ndarray) else value
+                        for name, value in frame.items()}
+                length = min(int(self.header[FIELD['stats_length']]), self.stats_block.size)
+                stats = bytes(self.stats_block.buf[:length])
+                if self.consistent(seq):
+                    copy['stats'] = json.loads(stats) if stats else {}
+                    return copy
+            if time.monotonic() > deadline:
+                raise TimeoutError("Не удалось прочитать согласованный кадр")
+            time.sleep(0)
+
+    def close(self):
+        self._close_groups()
+        del self.header, self.food
+        for block in (self.header_block, self.food_block):
+            block.close()
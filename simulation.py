@@ -1,6 +1,145 @@
+import random
+
+import numpy as np
+
+from combat import resolve_combat
+from lattice import LatticeNeighborCache
+from pipeline import (BLACK_ANTS, CACHES, CREATURES, DAY, EXPORT, FOOD, HISTORY, KEYFRAMES, MEMORY, NEIGHBORS, RECORDER,
+                      RED_ANTS, RNG, SNAPSHOTS, TIMERS, WORLD, Phase, TickPipeline)
+from recorder import Recorder
+from spatial import NeighborCache
+from stats import StatsSnapshot
+from timer_wheel import TimerWheel
+
+
+# Фазы тика по умолчанию. Почти все фазы модели делают выборки из общих
+# генераторов (ресурс RNG), поэтому выполняются по порядку, и траектория
+# не зависит от пула; одновременно идут наблюдатели конца дня
+
+def _begin_day(simulation):
+    if simulation.recorder:
+        simulation.recorder.begin_day(simulation.day + 1)
+    if simulation.lineage:
+        simulation.lineage.begin_day(simulation.day + 1)
+
+
+def _advance_timers(simulation):
+    # События таймеров: снятие кулдаунов и начало старения
+    for owner, kind, entity in simulation.timers.advance():
+        owner.on_timer(kind, entity)
+
+
+def _update_environment(simulation):
+    simulation.environment.update()
+
+
+def _move_red(simulation):
+    simulation.red_colony.move_ants()
+
+
+def _move_black(simulation):
+    simulation.black_colony.move_ants()
+
+
+def _update_creatures(simulation):
+    # Хищники двигаются и заявляют удары
+    if simulation.creature_manager:
+        simulation.creature_manager.update(simulation.red_colony.ants, simulation.black_colony.ants)
+
+
+def _combat(simulation):
+    # Все атаки тика применяются одновременно
+    resolve_combat(simulation.red_colony, simulation.black_colony, simulation.creature_manager,
+                   simulation.neighbors, simulation.recorder)
+
+
+def _update_red(simulation):
+    # Размножение, смерть и т.д.
+    simulation.red_colony.update(simulation.creature_manager)
+
+
+def _update_black(simulation):
+    simulation.black_colony.update(simulation.creature_manager)
+
+
+def _advance_day(simulation):
+    simulation.day += 1
+
+
+def _account_memory(simulation):
+    if simulation.memory_monitor:
+        simulation.memory_monitor.on_day()
+
+
+def _append_history(simulation):
+    # Сохранение истории из снимка нового дня, который затем покажет интерфейс
+    snapshot = simulation.stats()
+    simulation.red_population_history.append(snapshot.red_ants)
+    simulation.black_population_history.append(snapshot.black_ants)
+    
+    if simulation.creature_manager:
+        simulation.peaceful_creatures_history.append(snapshot.peaceful_creatures)
+        simulation.predator_history.append(snapshot.predators)
+    
+    # Сохранение истории характеристик
+    simulation.red_stats_history.append(snapshot.red_stats)
+    simulation.black_stats_history.append(snapshot.black_stats)
+    simulation.red_quantiles_history.append(snapshot.red_quantiles)
+    simulation.black_quantiles_history.append(snapshot.black_quantiles)
+    if snapshot.memory and snapshot.memory['day'] == simulation.day:
+        simulation.memory_history.append(snapshot.memory)
+
+
+def _save_keyframe(simulation):
+    if simulation.recorder and simulation.recorder.wants_keyframe(simulation.day):
+        simulation.recorder.save_keyframe(simulation)
+
+
+def _publish_state(simulation):
+    if simulation.state_exporter:
+        simulation.state_exporter.publish()
+
+
+def _capture_snapshot(simulation):
+    if simulation.snapshot_recorder:
+        simulation.snapshot_recorder.capture()
+
+
+def default_pipeline(executor=None):
+    """Конвейер тика с фазами модели в прежнем порядке
+
+    Фазы модели выбирают из общих генераторов random и np.random и пишут
+    в журнал событий, поэтому все они конфликтуют по RNG и RECORDER и
+    выполняются последовательно. Одновременно executor выполняет лишь
+    фазы после advance_day: ключевой кадр и экспорт состояния.
+    """
+    colony = {TIMERS, FOOD, RNG, RECORDER, NEIGHBORS}
+    return TickPipeline([
+        Phase('begin_day', _begin_day, reads={DAY}, writes={RECORDER}),
+        Phase('timers', _advance_timers, reads={DAY}, writes={TIMERS, RED_ANTS, BLACK_ANTS}),
+        Phase('environment', _update_environment, writes={FOOD, RNG, RECORDER}),
+        Phase('move_red', _move_red, writes={RED_ANTS, FOOD, RNG, RECORDER}),
+        Phase('move_black', _move_black, writes={BLACK_ANTS, FOOD, RNG, RECORDER}),
+        Phase('creatures', _update_creatures, reads={RED_ANTS, BLACK_ANTS},
+              writes={CREATURES, RNG, RECORDER, NEIGHBORS}),
+        Phase('combat', _combat, writes={RED_ANTS, BLACK_ANTS, CREATURES, RNG, RECORDER, NEIGHBORS}),
+        Phase('update_red', _update_red, writes=colony | {RED_ANTS, CREATURES}),
+        Phase('update_black', _update_black, writes=colony | {BLACK_ANTS, CREATURES}),
+        Phase('advance_day', _advance_day, writes={DAY}),
+        Phase('memory', _account_memory, reads=WORLD, writes={MEMORY}),
+        Phase('history', _append_history, reads=WORLD | {MEMORY}, writes={HISTORY, CACHES}),
+        # Наблюдатели не меняют модель; ключевой кадр не сохраняет кэши и идет
+        # одним этапом с экспортом, а экспорт и снимки заполняют общие кэши по очереди
+        Phase('keyframe', _save_keyframe, reads=WORLD | {RNG}, writes={KEYFRAMES}),
+        Phase('export', _publish_state, reads=WORLD, writes={EXPORT, CACHES}),
+        Phase('snapshots', _capture_snapshot, reads=WORLD, writes={SNAPSHOTS, CACHES}),
+    ], executor)
+
+
 class Simulation:
     """Класс для управления симуляцией"""
-    def __init__(self, environment, red_colony, black_colony, creature_manager=None):
+    def __init__(self, environment, red_colony, black_colony, creature_manager=None, recorder=None,
+                 lineage=None, criteria=(), pipeline=None):
         self.environment = environment
         self.red_colony = red_colony
         self.black_colony = black_colony
@@ -9,6 +148,21 @@ class Simulation:
         self.paused = False
         self.speed = 1.0  # Множитель скорости симуляции
         
+        # Общее колесо таймеров: окончание кулдаунов и начало старения
+        self.timers = TimerWheel(self.day - 1)
+        self.red_colony.set_timers(self.timers)
+        self.black_colony.set_timers(self.timers)
+        
+        # Общий кэш пар соседей для всех фаз тика
+        self.neighbors = self._neighbor_cache()
+        self.red_colony.neighbors = self.neighbors
+        self.black_colony.neighbors = self.neighbors
+        if self.creature_manager:
+            self.creature_manager.neighbors = self.neighbors
+        
+        # Фазы тика: порядок, отключение, замеры времени и параллельные этапы
+        self.pipeline = pipeline or default_pipeline()
+        
         # История популяций
         self.red_population_history = []
         self.black_population_history = []
@@ -18,49 +172,139 @@ class Simulation:
         # История статистик
         self.red_stats_history = []
         self.black_stats_history = []
-    
-    def update(self):
-        """Обновление симуляции на один шаг"""
-        if self.paused:
-            return
-            
-        # Обновление среды
-        self.environment.update()
+        # История квантилей признаков (медиана, p10, p90)
+        self.red_quantiles_history = []
+        self.black_quantiles_history = []
         
-        # Передвижение муравьев
-        self.red_colony.move_ants()
-        self.black_colony.move_ants()
+        # Снимок статистики текущего дня, общий для истории и интерфейса
+        self._stats = None
         
-        # Атаки муравьев
-        self.red_colony.attack_enemies(self.black_colony)
-        self.black_colony.attack_enemies(self.red_colony)
+        # Необязательный учет памяти (MemoryMonitor подключается сам)
+        self.memory_monitor = None
+        self.memory_history = []
         
-        # Обновление существ и взаимодействие с муравьями
-        if self.creature_manager:
-            self.creature_manager.update(self.red_colony.ants, self.black_colony.ants)
-            
-            # Муравьи атакуют хищников
-            self.red_colony.attack_predators(self.creature_manager)
-            self.black_colony.attack_predators(self.creature_manager)
+        # Необязательная публикация состояния в shared_memory (SharedStateExporter)
+        self.state_exporter = None
+        
+        # Необязательная запись снимков для отрисовки без интерфейса (render.SnapshotRecorder)
+        self.snapshot_recorder = None
         
-        # Обновление колоний (размножение, смерть и т.д.)
-        self.red_colony.update(self.creature_manager)
-        self.black_colony.update(self.creature_manager)
+        # Критерии досрочной остановки и сработавший критерий
+        self.criteria = list(criteria)
+        self.stop_reason = None
         
-        # Сохранение истории популяций
-        self.red_population_history.append(self.red_colony.count())
-        self.black_population_history.append(self.black_colony.count())
+        # Необязательная родословная: рождения муравьев в массивах
+        self.lineage = lineage
+        if self.lineage:
+            self._connect_lineage()
         
+        # Необязательный журнал событий с ключевыми кадрами для перемотки
+        self.recorder = recorder
+        if self.recorder:
+            self._connect_recorder()
+            self.recorder.save_keyframe(self)
+    
+    def update(self):
+        """Обновление симуляции на один шаг: выполнение фаз конвейера тика"""
+        if self.paused:
+            return
+        self.pipeline.run(self)
+    
+    def run(self, days):
+        """Выполнение до days шагов симуляции без визуализации
+
+        Расчет прекращается раньше, если сработал один из критериев
+        остановки; его имя (или 'days') сохраняется в stop_reason.
+        """
+        self.stop_reason = None
+        for _ in range(days):
+            self.update()
+            if self.check_termination():
+                break
+        else:
+            self.stop_reason = 'days'
+        return self.get_stats()
+    
+    def check_termination(self, criteria=None):
+        """Имя первого сработавшего критерия остановки или None"""
+        for criterion in (self.criteria if criteria is None else criteria):
+            if criterion.check(self):
+                self.stop_reason = criterion.name
+                return criterion.name
+        return None
+    
+    def _neighbor_cache(self, executor=None):
+        """Кэш пар соседей под режим среды: сетки занятости на решетке, иначе сетка радиусов"""
+        if self.environment.lattice:
+            return LatticeNeighborCache(self.environment.width, self.environment.height, executor)
+        return NeighborCache(executor)
+    
+    def _connect_recorder(self):
+        """Подключение журнала событий ко всем источникам событий"""
+        self.environment.recorder = self.recorder
+        self.red_colony.recorder = self.recorder
+        self.black_colony.recorder = self.recorder
         if self.creature_manager:
-            creatures_count = self.creature_manager.count()
-            self.peaceful_creatures_history.append(creatures_count['peaceful'])
-            self.predator_history.append(creatures_count['predators'])
+            self.creature_manager.recorder = self.recorder
+    
+    def _connect_lineage(self):
+        """Подключение родословной; живущие сейчас муравьи записываются основателями"""
+        self.lineage.begin_day(self.day)
+        for colony in (self.red_colony, self.black_colony):
+            colony.lineage = self.lineage
+            self.lineage.record(Recorder.group_of(colony.ant_type), [ant.ant_id for ant in colony.ants])
+    
+    def seek(self, day):
+        """Переход к дню day: вперед - пересчетом, назад - от ближайшего ключевого кадра
+
+        Кадр хранит и состояние генераторов случайных чисел, поэтому
+        пересчет повторяет записанную траекторию; события уже записанных
+        дней повторно не пишутся. Возвращает новый текущий день.
+        """
+        if self.recorder is None:
+            raise ValueError("Перемотка требует журнала событий (recorder)")
+        if day < self.day:
+            self._load_keyframe(day)
         
-        # Сохранение истории характеристик
-        self.red_stats_history.append(self.red_colony.get_average_stats())
-        self.black_stats_history.append(self.black_colony.get_average_stats())
+        paused, self.paused = self.paused, False
+        while self.day < day:
+            self.update()
+        self.paused = paused
+        if len(self.red_population_history) != self.day:
+            raise RuntimeError(f"История популяций ({len(self.red_population_history)} дней) "
+                               f"не соответствует дню {self.day} после перемотки")
+        return self.day
+    
+    def _load_keyframe(self, day):
+        """Загрузка ближайшего к day ключевого кадра и отбрасывание историй после него"""
+        keyframe = self.recorder.nearest_keyframe(day)
+        if keyframe is None:
+            raise ValueError(f"Нет ключевого кадра до дня {day}")
         
-        self.day += 1
+        (self.environment, self.red_colony, self.black_colony, self.creature_manager, self.timers,
+         random_state, numpy_state) = self.recorder.load_keyframe(keyframe)
+        random.setstate(random_state)
+        np.random.set_state(numpy_state)
+        # Кэш соседей в кадр не сохраняется, создаем общий заново
+        self.neighbors = self._neighbor_cache(self.neighbors.executor)
+        self.red_colony.neighbors = self.neighbors
+        self.black_colony.neighbors = self.neighbors
+        if self.creature_manager:
+            self.creature_manager.neighbors = self.neighbors
+        self._connect_recorder()
+        self.day = keyframe
+        if self.lineage:
+            self._connect_lineage()
+        
+        self._stats = None
+        for history in (self.red_population_history, self.black_population_history,
+                        self.red_stats_history, self.black_stats_history,
+                        self.red_quantiles_history, self.black_quantiles_history):
+            del history[keyframe:]
+        if self.creature_manager:
+            del self.peaceful_creatures_history[keyframe:]
+            del self.predator_history[keyframe:]
+        self.memory_history = [metrics for metrics in self.memory_history if metrics['day'] <= keyframe]
     
     def toggle_pause(self):
         """Переключение паузы симуляции"""
@@ -72,19 +316,12 @@ class Simulation:
         self.speed = max(0.1, min(10.0, speed))
         return self.speed
     
+    def stats(self):
+        """Снимок статистики текущего дня, вычисляемый не чаще раза за день"""
+        if self._stats is None or self._stats.day != self.day:
+            self._stats = StatsSnapshot(self)
+        return self._stats
+    
     def get_stats(self):
         """Получение текущей статистики симуляции"""
-        stats = {
-            'day': self.day,
-            'red_ants': self.red_colony.count(),
-            'black_ants': self.black_colony.count(),
-            'red_stats': self.red_colony.get_average_stats(),
-            'black_stats': self.black_colony.get_average_stats()
-        }
-        
-        if self.creature_manager:
-            creatures_count = self.creature_manager.count()
-            stats['peaceful_creatures'] = creatures_count['peaceful']
-            stats['predators'] = creatures_count['predators']
-        
-        return stats
\ No newline at end of file
+        return self.stats().as_dict()
@@ -0,0 +1,233 @@
+import numpy as np
+
+
+def _empty_pairs():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+
+def neighbor_pairs(points_a, points_b, radius):
+    """Все пары точек (i из points_a, j из points_b) на расстоянии не больше radius
+
+    Точки раскладываются по сетке с шагом radius, и сравниваются только
+    соседние ячейки, поэтому стоимость пропорциональна числу близких пар,
+    а не произведению размеров наборов. Возвращает индексы i, j и квадраты
+    расстояний.
+    """
+    points_a = np.asarray(points_a, dtype=float).reshape(-1, 2)
+    points_b = np.asarray(points_b, dtype=float).reshape(-1, 2)
+    if not len(points_a) or not len(points_b) or not radius > 0:
+        return _empty_pairs()
+
+    cells_a = np.floor(points_a / radius).astype(np.int64)
+    cells_b = np.floor(points_b / radius).astype(np.int64)
+    origin = np.minimum(cells_a.min(axis=0), cells_b.min(axis=0)) - 1
+    cells_a -= origin
+    cells_b -= origin
+    span = max(cells_a[:, 1].max(), cells_b[:, 1].max()) + 2
+
+    keys_b = cells_b[:, 0] * span + cells_b[:, 1]
+    order = np.argsort(keys_b, kind='stable')
+    sorted_keys = keys_b[order]
+
+    found_a = []
+    found_b = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            keys = (cells_a[:, 0] + dx) * span + (cells_a[:, 1] + dy)
+            low = np.searchsorted(sorted_keys, keys, 'left')
+            counts = np.searchsorted(sorted_keys, keys, 'right') - low
+            total = counts.sum()
+            if not total:
+                continue
+            # Разворачиваем диапазоны [low, low + count) в плоский список индексов
+            starts = np.repeat(low - (np.cumsum(counts) - counts), counts)
+            found_a.append(np.repeat(np.arange(len(points_a)), counts))
+            found_b.append(order[np.arange(total) + starts])
+
+    if not found_a:
+        return _empty_pairs()
+    index_a = np.concatenate(found_a)
+    index_b = np.concatenate(found_b)
+    delta = points_a[index_a] - points_b[index_b]
+    distance_sq = delta[:, 0] ** 2 + delta[:, 1] ** 2
+    close = distance_sq <= radius * radius
+    return index_a[close], index_b[close], distance_sq[close]
+
+
+def greedy_matching(index_a, index_b, distance_sq):
+    """Паросочетание по парам-кандидатам: каждый участвует не более одного раза
+
+    В каждом раунде принимаются взаимно ближайшие пары, после чего
+    занятые участники исключаются. Раунды повторяются, пока есть кандидаты,
+    так что результат - максимальное паросочетание с приоритетом близких пар.
+    """
+    order = np.lexsort((index_b, index_a, distance_sq))
+    index_a, index_b = index_a[order], index_b[order]
+    matched_a = []
+    matched_b = []
+    while len(index_a):
+        # Ближайший кандидат для каждого a, затем для каждого b среди них
+        _, first_a = np.unique(index_a, return_index=True)
+        best = np.sort(first_a)
+        _, first_b = np.unique(index_b[best], return_index=True)
+        accepted = best[first_b]
+        matched_a.append(index_a[accepted])
+        matched_b.append(index_b[accepted])
+        free = ~np.isin(index_a, index_a[accepted]) & ~np.isin(index_b, index_b[accepted])
+        index_a, index_b = index_a[free], index_b[free]
+
+    if not matched_a:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(matched_a), np.concatenate(matched_b)
+
+
+def _neighbor_pairs_chunk(args):
+    return neighbor_pairs(*args)
+
+
+class NeighborCache:
+    """Общий для всех фаз тика кэш пар соседей
+
+    Группа - любой объект с атрибутом version и методом positions()
+    (EntityList колонии, CreatureStore). Пары двух групп вычисляются один
+    раз в наибольшем запрошенном радиусе и пересчитываются только после
+    изменения version одной из групп, то есть когда ее сущности сдвинулись
+    или сменился состав. Погибшие фильтруются потребителями по маске
+    живых, поэтому смерть кэш не сбрасывает.
+    """
+
+    def __init__(self, executor=None, chunk_size=50_000):
+        self.executor = executor  # Пул для расчета пар по частям
+        self.chunk_size = chunk_size
+        self.entries = {}
+        self.computed = 0  # Сколько раз пары пересчитывались
+        self.reused = 0    # Сколько запросов обслужено из кэша
+
+    def __getstate__(self):
+        """При сохранении состояния пары и пул не сохраняются"""
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['entries'] = {}
+        return state
+
+    def pairs(self, group_a, group_b, radius):
+        """Пары (i, j, квадрат расстояния) групп на расстоянии не больше radius
+
+        Для group_a is group_b пары точки с самой собой исключаются.
+        """
+        found = self._lookup(group_a, group_b, radius)
+        if found is None:
+            found = self._lookup(group_b, group_a, radius)
+            if found is not None:
+                (index_b, index_a, distance_sq), cached_radius = found
+                found = (index_a, index_b, distance_sq), cached_radius
+        if found is None:
+            # Пересчет сразу в наибольшем радиусе, который запрашивался для этих групп
+            previous = self.entries.get((id(group_a), id(group_b)))
+            cached_radius = max(radius, previous[2]) if previous else radius
+            pairs = self._compute(group_a, group_b, cached_radius)
+        else:
+            pairs, cached_radius = found
+            self.reused += 1
+
+        if cached_radius > radius:
+            index_a, index_b, distance_sq = pairs
+            close = distance_sq <= radius * radius
+            return index_a[close], index_b[close], distance_sq[close]
+        return pairs
+
+    def _lookup(self, group_a, group_b, radius):
+        """Актуальные пары и их радиус для групп или None"""
+        entry = self.entries.get((id(group_a), id(group_b)))
+        if entry is None:
+            return None
+        refs, versions, cached_radius, pairs = entry
+        if refs[0] is not group_a or refs[1] is not group_b:
+            return None
+        if versions != (group_a.version, group_b.version) or cached_radius < radius:
+            return None
+        return pairs, cached_radius
+
+    def _compute(self, group_a, group_b, radius):
+        """Пересчет пар двух групп"""
+        points_a = group_a.positions()
+        points_b = group_b.positions()
+        if self.executor is not None and len(points_a) > self.chunk_size:
+            starts = range(0, len(points_a), self.chunk_size)
+            chunks = [(points_a[start:start + self.chunk_size], points_b, radius) for start in starts]
+            results = list(self.executor.map(_neighbor_pairs_chunk, chunks))
+            index_a = np.concatenate([found + start for start, (found, _, _) in zip(starts, results)])
+            index_b = np.concatenate([found for _, found, _ in results])
+            distance_sq = np.concatenate([found for _, _, found in results])
+        else:
+            index_a, index_b, distance_sq = neighbor_pairs(points_a, points_b, radius)
+        if group_a is group_b:
+            distinct = index_a != index_b
+            index_a, index_b, distance_sq = index_a[distinct], index_b[distinct], distance_sq[distinct]
+
+        pairs = (index_a, index_b, distance_sq)
+        self.entries[(id(group_a), id(group_b))] = ((group_a, group_b), (group_a.version, group_b.version),
+                                                    radius, pairs)
+        self.computed += 1
+        return pairs
+
+
+class GridIndex:
+    """Индекс точек группы по ячейкам сетки для запросов прямоугольником
+
+    Точки сортируются по ключу ячейки, и для каждой ячейки хранится
+    начало ее диапазона, поэтому запрос обходит только ячейки,
+    пересекающие прямоугольник, и точки в них. Индекс перестраивается,
+    только когда меняется version группы (как в NeighborCache), так что
+    повторные запросы без шага симуляции - например, при прокрутке
+    остановленной симуляции - не трогают остальные точки.
+    """
+
+    def __init__(self, cell=10.0):
+        self.cell = cell
+        self.group = None
+        self.version = None
+        self.order = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(1, dtype=np.int64)
+        self.columns = self.rows = 0
+        self.points = np.zeros((0, 2))
+
+    def update(self, group):
+        """Перестройка индекса, если группа или ее version изменились"""
+        if group is self.group and group.version == self.version:
+            return self
+        self.group = group
+        self.version = group.version
+        self.points = points = np.asarray(group.positions(), dtype=float).reshape(-1, 2)
+        if not len(points):
+            self.order = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(1, dtype=np.int64)
+            self.columns = self.rows = 0
+            return self
+        cells = np.maximum(np.floor(points / self.cell).astype(np.int64), 0)
+        self.columns, self.rows = cells.max(axis=0) + 1
+        keys = cells[:, 0] * self.rows + cells[:, 1]
+        self.order = np.argsort(keys)
+        counts = np.bincount(keys, minlength=self.columns * self.rows)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+        return self
+
+    def query(self, x0, y0, x1, y1):
+        """Индексы точек в прямоугольнике [x0, x1] x [y0, y1]"""
+        column_range = np.arange(max(int(x0 // self.cell), 0), min(int(x1 // self.cell) + 1, self.columns))
+        row_low = max(int(y0 // self.cell), 0)
+        row_high = min(int(y1 // self.cell) + 1, self.rows)
+        if not len(column_range) or row_low >= row_high:
+            return np.zeros(0, dtype=np.int64)
+        # Ячейки одного столбца сетки идут подряд, поэтому столбец - один диапазон
+        low = self.starts[column_range * self.rows + row_low]
+        high = self.starts[column_range * self.rows + row_high]
+        counts = high - low
+        total = counts.sum()
+        if not total:
+            return np.zeros(0, dtype=np.int64)
+        offsets = np.repeat(low - (np.cumsum(counts) - counts), counts)
+        found = self.order[np.arange(total) + offsets]
+        points = self.points[found]
+        inside = (points[:, 0] >= x0) & (points[:, 0] <= x1) & (points[:, 1] >= y0) & (points[:, 1] <= y1)
+        return found[inside]
@@ -0,0 +1,83 @@
+class StatsSnapshot:
+    """Статистика симуляции за один день, вычисляемая лениво
+
+    Каждая величина считается при первом обращении и дальше берется из
+    снимка, поэтому запись истории, панель статистики, график популяций и
+    визуализация используют одни и те же результаты. Simulation выдает
+    новый снимок, как только день сменился.
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.day = simulation.day
+        self._values = {}
+
+    def _cached(self, name, compute):
+        """Значение name, при первом обращении вычисляемое через compute"""
+        if name not in self._values:
+            self._values[name] = compute()
+        return self._values[name]
+
+    @property
+    def red_ants(self):
+        return self._cached('red_ants', self.simulation.red_colony.count)
+
+    @property
+    def black_ants(self):
+        return self._cached('black_ants', self.simulation.black_colony.count)
+
+    @property
+    def red_stats(self):
+        return self._cached('red_stats', self.simulation.red_colony.get_average_stats)
+
+    @property
+    def black_stats(self):
+        return self._cached('black_stats', self.simulation.black_colony.get_average_stats)
+
+    @property
+    def red_quantiles(self):
+        return self._cached('red_quantiles', self.simulation.red_colony.get_trait_quantiles)
+
+    @property
+    def black_quantiles(self):
+        return self._cached('black_quantiles', self.simulation.black_colony.get_trait_quantiles)
+
+    @property
+    def memory(self):
+        """Последний отчет MemoryMonitor (байты по подсистемам) или None"""
+        monitor = self.simulation.memory_monitor
+        return self._cached('memory', lambda: monitor.metrics if monitor else None)
+
+    @property
+    def creatures(self):
+        """Численность существ по типам или None, если существ нет"""
+        creature_manager = self.simulation.creature_manager
+        return self._cached('creatures', creature_manager.count if creature_manager else lambda: None)
+
+    @property
+    def peaceful_creatures(self):
+        return self.creatures['peaceful'] if self.creatures else 0
+
+    @property
+    def predators(self):
+        return self.creatures['predators'] if self.creatures else 0
+
+    def as_dict(self):
+        """Статистика в формате Simulation.get_stats"""
+        def build():
+            stats = {
+                'day': self.day,
+                'red_ants': self.red_ants,
+                'black_ants': self.black_ants,
+                'red_stats': self.red_stats,
+                'black_stats': self.black_stats,
+                'red_quantiles': self.red_quantiles,
+                'black_quantiles': self.black_quantiles
+            }
+            if self.creatures is not None:
+                stats['peaceful_creatures'] = self.peaceful_creatures
+                stats['predators'] = self.predators
+            if self.memory is not None:
+                stats['memory'] = self.memory
+            return stats
+        return self._cached('dict', build)
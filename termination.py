@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class Extinction:
+    """Остановка, когда вымерла хотя бы одна колония"""
+
+    name = 'extinction'
+
+    def check(self, simulation):
+        snapshot = simulation.stats()
+        return snapshot.red_ants == 0 or snapshot.black_ants == 0
+
+
+class PopulationFloor:
+    """Остановка, когда общая численность муравьев опустилась ниже floor"""
+
+    name = 'population_floor'
+
+    def __init__(self, floor):
+        self.floor = floor
+
+    def check(self, simulation):
+        snapshot = simulation.stats()
+        return snapshot.red_ants + snapshot.black_ants < self.floor
+
+
+class Convergence:
+    """Остановка, когда ряды истории установились
+
+    Ряд считается установившимся, если за последние window дней его
+    размах не превышает tolerance от среднего значения. Ряды задаются
+    именами: 'red_ants', 'black_ants', 'peaceful_creatures', 'predators'
+    для численности и 'red_stats.<признак>' / 'black_stats.<признак>' для
+    средних признаков.
+    """
+
+    name = 'convergence'
+
+    HISTORIES = {
+        'red_ants': 'red_population_history',
+        'black_ants': 'black_population_history',
+        'peaceful_creatures': 'peaceful_creatures_history',
+        'predators': 'predator_history',
+        'red_stats': 'red_stats_history',
+        'black_stats': 'black_stats_history',
+    }
+
+    def __init__(self, window=100, tolerance=0.05, series=('red_ants', 'black_ants')):
+        self.window = window
+        self.tolerance = tolerance
+        self.series = series
+
+    def _values(self, simulation, series):
+        history_name, _, trait = series.partition('.')
+        history = getattr(simulation, self.HISTORIES[history_name])[-self.window:]
+        if trait:
+            history = [stats[trait] for stats in history]
+        return np.asarray(history, dtype=float)
+
+    def check(self, simulation):
+        for series in self.series:
+            values = self._values(simulation, series)
+            if len(values) < self.window:
+                return False
+            if values.max() - values.min() > self.tolerance * max(abs(values.mean()), 1e-9):
+                return False
+        return True
@@ -0,0 +1,66 @@
+class TimerWheel:
+    """Иерархическое колесо таймеров для отложенных событий симуляции
+
+    Событие планируется на номер тика и возвращается из advance(), когда
+    симуляция доходит до этого тика. Каждый уровень колеса содержит
+    SLOTS ячеек, ячейка уровня l покрывает SLOTS ** l тиков; при переходе
+    границы блока события верхнего уровня раскладываются по нижним.
+    Планирование и срабатывание стоят O(1) на событие независимо от числа
+    ожидающих таймеров.
+    """
+
+    BITS = 6
+    SLOTS = 1 << BITS
+    LEVELS = 4
+
+    def __init__(self, now=-1):
+        self.now = now  # Номер последнего обработанного тика
+        self.levels = [[[] for _ in range(self.SLOTS)] for _ in range(self.LEVELS)]
+        self.overflow = []  # События дальше, чем вмещает колесо
+        self.pending = 0
+
+    def schedule(self, delay, event):
+        """Планирование события через delay тиков (не раньше следующего тика)"""
+        self._insert(self.now + max(1, delay), event)
+        self.pending += 1
+
+    def _insert(self, due, event):
+        """Размещение события на уровне, соответствующем удаленности срока"""
+        for level in range(self.LEVELS):
+            shift = self.BITS * (level + 1)
+            # Срок и текущий тик в одном блоке следующего уровня
+            if due >> shift == self.now >> shift:
+                slot = (due >> (self.BITS * level)) & (self.SLOTS - 1)
+                self.levels[level][slot].append((due, event))
+                return
+        self.overflow.append((due, event))
+
+    def _cascade(self):
+        """Перенос событий с верхних уровней при переходе границы блока"""
+        # Полный оборот колеса: пересматриваем дальние события
+        if not self.now & ((1 << (self.BITS * self.LEVELS)) - 1):
+            entries, self.overflow = self.overflow, []
+            for due, event in entries:
+                self._insert(due, event)
+
+        # Сверху вниз, чтобы перенесенные события успели попасть на нижние уровни
+        for level in range(self.LEVELS - 1, 0, -1):
+            if self.now & ((1 << (self.BITS * level)) - 1):
+                continue
+            slot = (self.now >> (self.BITS * level)) & (self.SLOTS - 1)
+            entries = self.levels[level][slot]
+            self.levels[level][slot] = []
+            for due, event in entries:
+                self._insert(due, event)
+
+    def advance(self):
+        """Переход к следующему тику; возвращает список наступивших событий"""
+        self.now += 1
+        self._cascade()
+        slot = self.now & (self.SLOTS - 1)
+        entries = self.levels[0][slot]
+        if not entries:
+            return []
+        self.levels[0][slot] = []
+        self.pending -= len(entries)
+        return [event for _, event in entries]
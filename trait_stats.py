@@ -0,0 +1,109 @@
+import numpy as np
+
+# Признаки, не меняющиеся за жизнь муравья: их значения при рождении и
+# при гибели совпадают, поэтому гистограмму можно вести только по этим событиям.
+# Здоровье меняется от урона и старости и сюда не входит.
+STATIC_TRAITS = ('damage', 'speed', 'fertility', 'awareness')
+
+# Квантили, которые попадают в статистику и историю
+QUANTILES = {'p10': 0.1, 'median': 0.5, 'p90': 0.9}
+
+
+class TraitHistogram:
+    """Потоковая гистограмма неотрицательного признака с добавлением и удалением
+
+    Ячейки одинаковой ширины начинаются с нуля. Если новое значение не
+    помещается, соседние ячейки попарно сливаются и ширина удваивается,
+    так что число ячеек постоянно, а каждое значение по-прежнему лежит в
+    ячейке, содержащей его. Квантили оцениваются по накопленным счетчикам
+    с точностью до ширины ячейки за O(bins).
+    """
+
+    def __init__(self, bins=64):
+        self.bins = bins
+        self.width = None  # Ширина ячейки; задается первым набором значений
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.total = 0
+
+    def _fit(self, top):
+        """Расширение диапазона, чтобы в него попадало значение top"""
+        if self.width is None:
+            # Первые значения занимают нижнюю половину диапазона
+            self.width = max(top, 1e-9) * 2 / self.bins
+        while top >= self.width * self.bins:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts[:] = 0
+            self.counts[:len(merged)] = merged
+            self.width *= 2
+
+    def _index(self, values):
+        return np.clip((values / self.width).astype(np.int64), 0, self.bins - 1)
+
+    def add(self, values):
+        if not len(values):
+            return
+        self._fit(values.max())
+        self.counts += np.bincount(self._index(values), minlength=self.bins)
+        self.total += len(values)
+
+    def remove(self, values):
+        if not len(values) or self.width is None:
+            return
+        self.counts -= np.bincount(self._index(values), minlength=self.bins)
+        self.total -= len(values)
+
+    def edges(self):
+        """Границы ячеек (bins + 1 значение)"""
+        return np.arange(self.bins + 1) * (self.width or 0.0)
+
+    def quantiles(self, qs):
+        """Оценки квантилей qs линейной интерполяцией внутри ячейки"""
+        qs = np.asarray(qs, dtype=float)
+        if not self.total:
+            return np.zeros(len(qs))
+        cumulative = np.cumsum(self.counts)
+        targets = qs * self.total
+        index = np.minimum(np.searchsorted(cumulative, targets, 'left'), self.bins - 1)
+        below = cumulative[index] - self.counts[index]
+        fraction = (targets - below) / np.maximum(self.counts[index], 1)
+        return (index + np.clip(fraction, 0, 1)) * self.width
+
+
+class TraitDistribution:
+    """Распределения неизменных признаков колонии, обновляемые при рождении и гибели"""
+
+    def __init__(self, traits=STATIC_TRAITS, bins=64):
+        self.traits = traits
+        self.histograms = {name: TraitHistogram(bins) for name in traits}
+
+    def _values(self, ants):
+        return np.array([[getattr(ant, name) for name in self.traits] for ant in ants],
+                        dtype=float).reshape(-1, len(self.traits))
+
+    def add(self, ants):
+        values = self._values(ants)
+        for column, name in enumerate(self.traits):
+            self.histograms[name].add(values[:, column])
+
+    def add_columns(self, columns):
+        """Добавление значений, уже собранных в массивы по признакам"""
+        for name in self.traits:
+            self.histograms[name].add(np.asarray(columns[name], dtype=float))
+
+    def remove(self, ants):
+        values = self._values(ants)
+        for column, name in enumerate(self.traits):
+            self.histograms[name].remove(values[:, column])
+
+    def summary(self):
+        """Квантили QUANTILES каждого признака: {признак: {'p10': .., 'median': .., 'p90': ..}}"""
+        summary = {}
+        for name, histogram in self.histograms.items():
+            values = histogram.quantiles(list(QUANTILES.values())).tolist()
+            summary[name] = dict(zip(QUANTILES, values))
+        return summary
+
+    def histogram(self, name):
+        """Границы ячеек и счетчики гистограммы признака name"""
+        histogram = self.histograms[name]
+        return histogram.edges(), histogram.counts.copy()
@@ -4,12 +4,21 @@ from matplotlib.animation import FuncAnimation
 from matplotlib.colors import LinearSegmentedColormap
 import matplotlib.patches as mpatches
 
+from density import POINTS, DensityOverlay
+from termination import Extinction
+
 class AntVisualization:
     """Класс для визуализации симуляции муравьев"""
     
     def __init__(self, simulation):
         self.simulation = simulation
         self.environment = simulation.environment
+        # Анимация останавливается по критериям симуляции, по умолчанию - при вымирании колонии
+        self.criteria = simulation.criteria or [Extinction()]
+        self.animation = None
+        # Выше порога сущностей вместо точек рисуется слой плотности
+        self.overlay = DensityOverlay(simulation)
+        self.food_source = None  # Среда и версия еды, переданные слою еды
         self.fig, self.ax = plt.subplots(figsize=(10, 8))
         self.fig.canvas.manager.set_window_title('Симуляция колонии муравьев')
         
@@ -26,6 +35,15 @@ class AntVisualization:
             aspect='equal'
         )
         
+        # Слой плотности и территорий: одно изображение вместо точек
+        self.density_layer = self.ax.imshow(
+            np.zeros((1, 1, 4), dtype=np.uint8),
+            origin='lower',
+            extent=(0, self.overlay.columns * self.overlay.cell, 0, self.overlay.rows * self.overlay.cell),
+            interpolation='nearest',
+            visible=False
+        )
+        
         # Инициализация графических объектов для муравьев
         self.red_ants, = self.ax.plot([], [], 'ro', ms=4, label='Красные муравьи')
         self.black_ants, = self.ax.plot([], [], 'ko', ms=4, label='Черные муравьи')
@@ -59,32 +77,53 @@ class AntVisualization:
         self.red_ants.set_data([], [])
         self.black_ants.set_data([], [])
         self.food_layer.set_array(np.zeros((self.environment.width, self.environment.height)))
+        self.density_layer.set_visible(False)
         self.stats_text.set_text('')
-        return self.red_ants, self.black_ants, self.food_layer, self.stats_text
+        return self.red_ants, self.black_ants, self.food_layer, self.density_layer, self.stats_text
     
     def update(self, frame):
         """Обновление одного кадра анимации"""
         # Обновление симуляции
         self.simulation.update()
+        artists = self.draw()
         
-        # Обновление позиций муравьев
-        red_x = [ant.position[0] for ant in self.simulation.red_colony.ants]
-        red_y = [ant.position[1] for ant in self.simulation.red_colony.ants]
-        black_x = [ant.position[0] for ant in self.simulation.black_colony.ants]
-        black_y = [ant.position[1] for ant in self.simulation.black_colony.ants]
-        
-        self.red_ants.set_data(red_x, red_y)
-        self.black_ants.set_data(black_x, black_y)
-        
-        # Обновление карты еды
-        self.food_layer.set_array(self.environment.food_map.T)  # Транспонируем для правильного отображения
+        # Проверка на завершение симуляции
+        reason = self.simulation.check_termination(self.criteria)
+        if reason:
+            plt.title(f"Симуляция завершена ({reason})! День: {self.simulation.day}")
+            if self.animation:
+                self.animation.event_source.stop()
+        return artists
+    
+    def draw(self):
+        """Отрисовка текущего состояния симуляции"""
+        # Обновление позиций муравьев или слоя плотности
+        mode = self.overlay.active_mode()
+        if mode == POINTS:
+            red_positions = self.simulation.red_colony.ants.positions()
+            black_positions = self.simulation.black_colony.ants.positions()
+            self.red_ants.set_data(red_positions[:, 0], red_positions[:, 1])
+            self.black_ants.set_data(black_positions[:, 0], black_positions[:, 1])
+            self.density_layer.set_visible(False)
+        else:
+            self.red_ants.set_data([], [])
+            self.black_ants.set_data([], [])
+            self.density_layer.set_data(self.overlay.image(mode))
+            self.density_layer.set_visible(True)
+        
+        # Обновление карты еды, только если она изменилась: пересчет слоя - самая дорогая часть кадра
+        previous = self.food_source
+        if not previous or previous[0] is not self.environment or previous[1] != self.environment.food_version:
+            self.food_layer.set_array(self.environment.food_map.T)  # Транспонируем для правильного отображения
+            self.food_source = (self.environment, self.environment.food_version)
         
         # Обновление текста статистики
-        red_count = self.simulation.red_colony.count()
-        black_count = self.simulation.black_colony.count()
+        snapshot = self.simulation.stats()
+        red_count = snapshot.red_ants
+        black_count = snapshot.black_ants
         
-        red_stats = self.simulation.red_colony.get_average_stats()
-        black_stats = self.simulation.black_colony.get_average_stats()
+        red_stats = snapshot.red_stats
+        black_stats = snapshot.black_stats
         
         stats_text = f"День: {self.simulation.day}\n"
         stats_text += f"Красные: {red_count} | Черные: {black_count}\n"
@@ -97,12 +136,7 @@ class AntVisualization:
         
         self.stats_text.set_text(stats_text)
         
-        # Проверка на завершение симуляции
-        if red_count == 0 or black_count == 0:
-            plt.title(f"Симуляция завершена! День: {self.simulation.day}")
-            return self.red_ants, self.black_ants, self.food_layer, self.stats_text
-        
-        return self.red_ants, self.black_ants, self.food_layer, self.stats_text
+        return self.red_ants, self.black_ants, self.food_layer, self.density_layer, self.stats_text
     
     def animate(self, frames=500, interval=100):
         """Запуск анимации"""